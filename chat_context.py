@@ -0,0 +1,91 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import llm_cache
+from token_estimate import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MODEL = "llama3-8b-8192"
+RECENT_MESSAGES = 6  # messages (3 exchanges) always kept verbatim once older ones are summarized
+PROMPT_TOKEN_BUDGET = 1500  # estimated prompt tokens per request, excluding the reply
+SUMMARY_MAX_TOKENS = 200
+
+# Older turns are folded into the summary off the request path
+summary_executor = ThreadPoolExecutor(max_workers=2)
+
+# Per-conversation state, kept in st.session_state: messages[:summarized] are covered by summary
+def new_context():
+    return {"summary": "", "summarized": 0, "pending": None, "pending_upto": 0, "last_prompt_tokens": 0}
+
+def summarize_turns(client, summary, turns):
+    transcript = "\n".join(f"{turn['role']}: {turn['message']}" for turn in turns)
+    return llm_cache.cached_completion(
+        client,
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You maintain a short running summary of a conversation between a user and the EventBuddy assistant. Keep names, events, stalls and open requests."},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}\n\nReturn the updated summary."}
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0
+    ).strip()
+
+# Adopt a finished background summary, if any; with wait=True a running one is waited for
+def collect_summary(context, wait=False):
+    pending = context["pending"]
+    if pending is None or not (wait or pending.done()):
+        return
+    context["pending"] = None
+    try:
+        context["summary"] = pending.result()
+        context["summarized"] = context["pending_upto"]
+    except Exception as e:
+        logger.error(f"Chat summary failed: {str(e)}")
+
+# Start folding everything but the last RECENT_MESSAGES into the summary, unless a summary is already running
+def schedule_summary(client, context, conversation_history, recent_messages=RECENT_MESSAGES):
+    upto = len(conversation_history) - recent_messages
+    if context["pending"] is not None or upto <= context["summarized"]:
+        return
+    turns = list(conversation_history[context["summarized"]:upto])
+    context["pending"] = summary_executor.submit(summarize_turns, client, context["summary"], turns)
+    context["pending_upto"] = upto
+
+# Newest unsummarized turns that fit in the budget after `used` tokens, the index of the oldest one kept and the new total
+def fit_recent_turns(conversation_history, summarized, used, budget):
+    recent, start = [], len(conversation_history)
+    for index in range(len(conversation_history) - 1, summarized - 1, -1):
+        tokens = estimate_tokens(conversation_history[index]["message"])
+        if used + tokens > budget:
+            break
+        recent.append({"role": conversation_history[index]["role"], "content": conversation_history[index]["message"]})
+        used += tokens
+        start = index
+    return recent[::-1], start, used
+
+# Prompt messages within the token budget: system prompt, rolling summary, then the newest unsummarized turns.
+# Turns that do not fit are folded into the summary first, so every turn is either verbatim or summarized.
+def build_messages(client, system_prompt, conversation_history, user_input, context, budget=PROMPT_TOKEN_BUDGET):
+    collect_summary(context)
+    while True:
+        head = [{"role": "system", "content": system_prompt}]
+        if context["summary"]:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation: {context['summary']}"})
+        tail = [{"role": "user", "content": user_input}]
+        used = sum(estimate_tokens(message["content"]) for message in head + tail)
+        recent, start, used = fit_recent_turns(conversation_history, context["summarized"], used, budget)
+        if start <= context["summarized"]:
+            break
+        # A running background summary may already cover the evicted turns; otherwise fold them in now
+        if context["pending"] is not None:
+            collect_summary(context, wait=True)
+            continue
+        try:
+            context["summary"] = summarize_turns(client, context["summary"], conversation_history[context["summarized"]:start])
+            context["summarized"] = start
+        except Exception as e:
+            logger.error(f"Chat summary failed, dropping {start - context['summarized']} older messages: {str(e)}")
+            break
+    context["last_prompt_tokens"] = used
+    logger.info(f"Chat prompt: {used} estimated tokens, {len(recent)} recent messages, summary covers {context['summarized']} messages")
+    return head + recent[::-1] + tail
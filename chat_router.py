@@ -0,0 +1,48 @@
+import re
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Keyword rules per intent, checked in order; the first intent with a matching pattern wins
+INTENT_PATTERNS = [
+    ("register", [r"\bregister\b", r"\bsign (me )?up\b", r"\bbook (a |my )?(seat|spot|ticket)"]),
+    ("create_event", [r"\b(create|add|host|organi[sz]e) (an? |my )?(new )?event\b"]),
+    ("crowd_density", [r"\bcrowd", r"\bdensity\b", r"\bhow (busy|packed|full)\b", r"\bqueue\b"]),
+    ("recommendations", [r"\brecommend", r"\bsuggest", r"\bwhat should i (attend|visit|go to)\b"]),
+    ("feedback", [r"\bfeedback\b", r"\breviews?\b", r"\bratings?\b"])
+]
+COMPILED_PATTERNS = [(intent, [re.compile(pattern, re.IGNORECASE) for pattern in patterns]) for intent, patterns in INTENT_PATTERNS]
+
+# Requests answered locally per intent, and requests that fell through to the LLM
+router_stats = {"routed": Counter(), "fallback": 0}
+
+def classify(text):
+    for intent, patterns in COMPILED_PATTERNS:
+        if any(pattern.search(text) for pattern in patterns):
+            return intent
+    return None
+
+# Longest known name mentioned in the text (case-insensitive), so "Tech Fest 2" beats "Tech Fest"
+def find_entity(text, names):
+    lowered = text.lower()
+    matches = [name for name in names if name and name.lower() in lowered]
+    return max(matches, key=len) if matches else None
+
+# Run the handler for the recognized intent; None means the caller should fall back to the LLM
+def route(text, handlers):
+    intent = classify(text)
+    handler = handlers.get(intent) if intent else None
+    reply = handler(text) if handler else None
+    if reply is None:
+        router_stats["fallback"] += 1
+        logger.info(f"Chat router: no local handler for intent {intent}, falling back to LLM")
+        return None
+    router_stats["routed"][intent] += 1
+    logger.info(f"Chat router: handled intent {intent} locally")
+    return reply
+
+def hit_rate():
+    routed = sum(router_stats["routed"].values())
+    total = routed + router_stats["fallback"]
+    return routed / total if total else 0.0
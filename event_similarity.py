@@ -0,0 +1,147 @@
+import sqlite3
+import math
+import sys
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = 'emr.db'
+TOP_K = 10  # similar events kept per event
+
+# Registrations per event, event pair co-registration counts and the top-k most similar events per event
+EVENT_SIMILARITY_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS event_popularity (
+        event_id INTEGER PRIMARY KEY,
+        registrations INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS event_cooccurrence (
+        event_a INTEGER NOT NULL,
+        event_b INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (event_a, event_b)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS event_similar (
+        event_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        similar_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (event_id, rank)
+    ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_event_similar_similar ON event_similar(similar_id)"
+]
+
+def create_similarity_tables(cursor):
+    for statement in EVENT_SIMILARITY_SCHEMA:
+        cursor.execute(statement)
+
+# Recompute one event's top-k list (cosine similarity over co-registrations) from its co-occurrence row.
+# This reads and sorts the whole row, so it costs O(n log n) in the n events ever co-registered with event_id.
+def refresh_similar(cursor, event_id, k=TOP_K):
+    cursor.execute("SELECT registrations FROM event_popularity WHERE event_id = ?", (event_id,))
+    row = cursor.fetchone()
+    cursor.execute("DELETE FROM event_similar WHERE event_id = ?", (event_id,))
+    if row is None or not row[0]:
+        return
+    cursor.execute("""
+        SELECT c.event_b, c.count, p.registrations
+        FROM event_cooccurrence c
+        JOIN event_popularity p ON p.event_id = c.event_b
+        WHERE c.event_a = ?
+    """, (event_id,))
+    scored = sorted(((count / math.sqrt(row[0] * registrations), other_id)
+                     for other_id, count, registrations in cursor.fetchall() if registrations),
+                    reverse=True)[:k]
+    cursor.executemany("INSERT INTO event_similar (event_id, rank, similar_id, score) VALUES (?, ?, ?, ?)",
+                       [(event_id, rank, other_id, score) for rank, (score, other_id) in enumerate(scored, start=1)])
+
+# Incremental update for a new registration: bump counts for the event and every event the user already has.
+# The count updates are O(r) in the user's r registrations; each of the r + 1 affected top-k lists is then
+# rebuilt with refresh_similar, so the total also grows with the co-occurrence rows of those events.
+def record_registration(cursor, user_id, event_id, k=TOP_K):
+    cursor.execute("SELECT event_id FROM registrations WHERE user_id = ? AND event_id != ?", (user_id, event_id))
+    others = [row[0] for row in cursor.fetchall()]
+    cursor.execute("""INSERT INTO event_popularity (event_id, registrations) VALUES (?, 1)
+                      ON CONFLICT(event_id) DO UPDATE SET registrations = registrations + 1""", (event_id,))
+    pairs = [(event_id, other_id) for other_id in others] + [(other_id, event_id) for other_id in others]
+    cursor.executemany("""INSERT INTO event_cooccurrence (event_a, event_b, count) VALUES (?, ?, 1)
+                          ON CONFLICT(event_a, event_b) DO UPDATE SET count = count + 1""", pairs)
+    # Scores of other neighbours of event_id drift slightly with its popularity; `rebuild` resyncs them
+    for affected_id in [event_id] + others:
+        refresh_similar(cursor, affected_id, k)
+
+# Drop a deleted event from the counts and from every top-k list that referenced it
+def remove_event(cursor, event_id, k=TOP_K):
+    cursor.execute("SELECT DISTINCT event_id FROM event_similar WHERE similar_id = ?", (event_id,))
+    affected = [row[0] for row in cursor.fetchall()]
+    cursor.execute("DELETE FROM event_cooccurrence WHERE event_a = ?", (event_id,))
+    cursor.execute("DELETE FROM event_cooccurrence WHERE event_b = ?", (event_id,))
+    cursor.execute("DELETE FROM event_popularity WHERE event_id = ?", (event_id,))
+    cursor.execute("DELETE FROM event_similar WHERE event_id = ?", (event_id,))
+    for affected_id in affected:
+        refresh_similar(cursor, affected_id, k)
+
+# Full rebuild from the registrations table
+def rebuild_similarity(cursor, k=TOP_K):
+    create_similarity_tables(cursor)
+    cursor.execute("DELETE FROM event_similar")
+    cursor.execute("DELETE FROM event_cooccurrence")
+    cursor.execute("DELETE FROM event_popularity")
+    cursor.execute("""
+        INSERT INTO event_popularity (event_id, registrations)
+        SELECT event_id, COUNT(*) FROM registrations WHERE event_id IS NOT NULL GROUP BY event_id
+    """)
+    cursor.execute("""
+        INSERT INTO event_cooccurrence (event_a, event_b, count)
+        SELECT a.event_id, b.event_id, COUNT(*)
+        FROM registrations a
+        JOIN registrations b ON a.user_id = b.user_id AND a.event_id != b.event_id
+        GROUP BY a.event_id, b.event_id
+    """)
+    cursor.execute("SELECT event_id FROM event_popularity")
+    event_ids = [row[0] for row in cursor.fetchall()]
+    for event_id in event_ids:
+        refresh_similar(cursor, event_id, k)
+    logger.info(f"Rebuilt similar-event lists for {len(event_ids)} events")
+    return len(event_ids)
+
+# "People who registered for X also registered for": O(k) read of the precomputed list
+def get_similar_events(cursor, event_id, k=TOP_K):
+    cursor.execute("""
+        SELECT e.*
+        FROM event_similar s
+        JOIN events e ON e.id = s.similar_id
+        WHERE s.event_id = ?
+        ORDER BY s.rank
+        LIMIT ?
+    """, (event_id, k))
+    return cursor.fetchall()
+
+# Merge the top-k lists of a user's registered events, skipping events they already have
+def recommend_for_user(cursor, user_id, k=TOP_K):
+    cursor.execute("""
+        SELECT s.similar_id, SUM(s.score) AS score
+        FROM registrations r
+        JOIN event_similar s ON s.event_id = r.event_id
+        WHERE r.user_id = ?
+          AND s.similar_id NOT IN (SELECT event_id FROM registrations WHERE user_id = ?)
+        GROUP BY s.similar_id
+        ORDER BY score DESC
+        LIMIT ?
+    """, (user_id, user_id, k))
+    ranked = [row[0] for row in cursor.fetchall()]
+    if not ranked:
+        return []
+    cursor.execute("SELECT * FROM events WHERE id IN ({})".format(','.join('?' * len(ranked))), ranked)
+    events = {row[0]: row for row in cursor.fetchall()}
+    return [events[event_id] for event_id in ranked if event_id in events]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python event_similarity.py rebuild [db_file]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    with sqlite3.connect(sys.argv[2] if len(sys.argv) > 2 else DB_FILE) as conn:
+        count = rebuild_similarity(conn.cursor())
+        conn.commit()
+    print(f"[{datetime.utcnow().isoformat()}] Rebuilt similar events for {count} events")
@@ -0,0 +1,92 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+RATINGS = range(1, 6)
+
+# Running feedback totals per event or stall; means are derived from the sums on read.
+# version is bumped on every change so cached analyses of an event can be invalidated.
+FEEDBACK_AGGREGATES_SCHEMA = '''CREATE TABLE IF NOT EXISTS feedback_aggregates (
+    event TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    rating_sum REAL NOT NULL DEFAULT 0,
+    {histogram},
+    sentiment_sum REAL NOT NULL DEFAULT 0,
+    responses INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+)'''.format(histogram=",\n    ".join(f"rating_{rating} INTEGER NOT NULL DEFAULT 0" for rating in RATINGS))
+
+# Add the version column to aggregate tables created before it existed
+def ensure_version_column(cursor):
+    cursor.execute("PRAGMA table_info(feedback_aggregates)")
+    if "version" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE feedback_aggregates ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+def rating_column(rating):
+    return f"rating_{min(max(int(round(float(rating))), RATINGS[0]), RATINGS[-1])}"
+
+# Add (sign=1) or subtract (sign=-1) one feedback entry from its event's totals.
+# Emptied rows are kept so the event's version never goes backwards.
+def apply_feedback(cursor, event, rating, sentiment, responded=False, sign=1):
+    column = rating_column(rating)
+    cursor.execute(f"""
+        INSERT INTO feedback_aggregates (event, count, rating_sum, {column}, sentiment_sum, responses, version)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(event) DO UPDATE SET
+            count = count + excluded.count,
+            rating_sum = rating_sum + excluded.rating_sum,
+            {column} = {column} + excluded.{column},
+            sentiment_sum = sentiment_sum + excluded.sentiment_sum,
+            responses = responses + excluded.responses,
+            version = version + 1
+    """, (event, sign, sign * float(rating), sign, sign * float(sentiment), sign * int(bool(responded))))
+
+def add_feedback(cursor, event, rating, sentiment):
+    apply_feedback(cursor, event, rating, sentiment)
+
+def remove_feedback(cursor, event, rating, sentiment, responded=False):
+    apply_feedback(cursor, event, rating, sentiment, responded, sign=-1)
+
+def record_response(cursor, event):
+    cursor.execute("UPDATE feedback_aggregates SET responses = responses + 1, version = version + 1 WHERE event = ?", (event,))
+
+# Recompute every aggregate from (event, rating, sentiment, responded) rows
+def rebuild_aggregates(cursor, rows):
+    cursor.execute(FEEDBACK_AGGREGATES_SCHEMA)
+    ensure_version_column(cursor)
+    cursor.execute("UPDATE feedback_aggregates SET count = 0, rating_sum = 0, {}, sentiment_sum = 0, responses = 0, version = version + 1".format(
+        ", ".join(f"rating_{rating} = 0" for rating in RATINGS)))
+    count = 0
+    for event, rating, sentiment, responded in rows:
+        apply_feedback(cursor, event, rating, sentiment, responded)
+        count += 1
+    logger.info(f"Rebuilt feedback aggregates from {count} feedback entries")
+    return count
+
+# Totals for one event as a dict, read with a single primary-key lookup
+def get_aggregate(cursor, event):
+    cursor.execute("SELECT * FROM feedback_aggregates WHERE event = ?", (event,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    row = dict(zip([column[0] for column in cursor.description], row))
+    if row["count"] <= 0:
+        return None
+    return {
+        "event": row["event"],
+        "count": row["count"],
+        "mean_rating": row["rating_sum"] / row["count"],
+        "histogram": {rating: row[f"rating_{rating}"] for rating in RATINGS},
+        "mean_sentiment": row["sentiment_sum"] / row["count"],
+        "responses": row["responses"],
+        "version": row["version"]
+    }
+
+def get_version(cursor, event):
+    cursor.execute("SELECT version FROM feedback_aggregates WHERE event = ?", (event,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def get_feedback_events(cursor):
+    cursor.execute("SELECT event FROM feedback_aggregates WHERE count > 0 ORDER BY event")
+    return [row[0] for row in cursor.fetchall()]
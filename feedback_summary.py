@@ -0,0 +1,70 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import llm_cache
+from token_estimate import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MODEL = "llama3-8b-8192"
+CHUNK_TOKENS = 1500  # feedback tokens per map prompt
+REDUCE_TOKENS = 3000  # summary tokens per reduce prompt before another reduce round
+SUMMARY_MAX_TOKENS = 200
+MAX_WORKERS = 4  # concurrent map requests
+CHUNK_CACHE_TTL = 7 * 24 * 3600  # chunk summaries are keyed by their content, so they can live long
+
+MAP_PROMPT = "Summarize the main points, praise and complaints in these feedback comments about {subject} in a few bullet points."
+REDUCE_PROMPT = "Merge these partial feedback summaries about {subject} into one set of bullet points, keeping recurring themes."
+
+
+# Pack texts in order into chunks of at most max_tokens; appending texts only changes the last chunk
+def chunk_texts(texts, max_tokens=CHUNK_TOKENS):
+    chunks, current, current_tokens = [], [], 0
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        # Oversized single comments are truncated rather than split across chunks
+        text = text[:max_tokens * CHARS_PER_TOKEN]
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def summarize_chunk(client, subject, chunk, instruction):
+    return llm_cache.cached_completion(
+        client,
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are an analyst condensing event feedback."},
+            {"role": "user", "content": instruction.format(subject=subject) + "\n\n" + "\n".join(f"- {text}" for text in chunk)}
+        ],
+        ttl=CHUNK_CACHE_TTL,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0
+    ).strip()
+
+# Summarize every chunk concurrently on a bounded pool; cached chunks return without an API call
+def summarize_chunks(client, subject, chunks, instruction, max_workers=MAX_WORKERS):
+    if len(chunks) == 1:
+        return [summarize_chunk(client, subject, chunks[0], instruction)]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda chunk: summarize_chunk(client, subject, chunk, instruction), chunks))
+
+# Map feedback to chunk summaries, then reduce summaries until they fit one prompt.
+# Feedback that already fits one chunk is returned as is, so small sets cost no extra round-trip.
+def summarize_feedback(client, subject, texts, max_workers=MAX_WORKERS):
+    chunks = chunk_texts(texts)
+    if not chunks:
+        return ""
+    if len(chunks) == 1:
+        return "\n".join(chunks[0])
+    summaries = summarize_chunks(client, subject, chunks, MAP_PROMPT, max_workers)
+    logger.info(f"Summarized {sum(len(chunk) for chunk in chunks)} feedback entries for {subject} in {len(chunks)} chunks")
+    while sum(estimate_tokens(summary) for summary in summaries) > REDUCE_TOKENS and len(summaries) > 1:
+        summaries = summarize_chunks(client, subject, chunk_texts(summaries, REDUCE_TOKENS), REDUCE_PROMPT, max_workers)
+    return "\n\n".join(summaries)
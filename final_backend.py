@@ -2,14 +2,20 @@ from flask import Flask, request, jsonify
 import sqlite3
 import csv
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from geopy.distance import geodesic
-from threading import Lock
+from threading import Lock, Thread
 from flask_cors import CORS
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import tempfile
 import time
 import errno
+import mmap
+import struct
+import math
+from interest_bits import encode_interests, decode_mask
+from stall_scoring import score_stalls, DEFAULT_TOP_N
+from spatial_index import create_spatial_index
 
 app = Flask(__name__)
 
@@ -26,9 +32,67 @@ STALLS_FILE = "stalls.csv"
 USER_LOCATIONS_FILE = "user_locations.csv"
 STALL_CATEGORIES_FILE = "stall_categories.csv"
 
+# Binary crowd state snapshot used for fast warm restarts
+SNAPSHOT_FILE = "crowd_state.snap"
+SNAPSHOT_MAGIC = b"EMRS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_INTERVAL = 30  # seconds between snapshot writes
+
+# Dead-banding: pings closer than this to the stored position, within the write age, only refresh a heartbeat
+DEADBAND_METERS = 10
+DEADBAND_MAX_AGE = 60  # seconds before an unchanged position is written again
+HEARTBEAT_MAX_AGE = 300  # seconds without a ping before a user's heartbeat is dropped
+
+# Damped Holt (level + trend) crowd forecasting per stall, sampled on a fixed cadence
+FORECAST_ALPHA = 0.5  # level smoothing
+FORECAST_BETA = 0.3  # trend smoothing
+FORECAST_DAMPING = 0.8  # per-step trend damping, bounds how far a trend is extrapolated
+FORECAST_MAX_TREND = 2.0  # people per minute
+FORECAST_SAMPLE_SECONDS = 60  # one model step per minute, using the latest recount
+FORECAST_MAX_CATCHUP = 60  # steps replayed after a quiet gap; longer gaps restart from the latest count
+FORECAST_HORIZONS = [5, 15, 30]  # minutes
+FORECAST_MAX_HORIZON = 120  # minutes; the damped trend has flattened out well before this
+
+# Streaming dwell-time and stall-to-stall flow analytics
+STALL_RADIUS_METERS = 50
+MAX_TRACKED_USERS = 10000  # least recently seen users are dropped beyond this
+MAX_FLOWS_PER_STALL = 20  # outgoing destinations kept per origin stall
+
+# Little's law wait estimates: decayed arrival/departure rates per stall
+RATE_WINDOW_MINUTES = 10  # time constant of the rate decay
+
+# Random per-process id in ETags and X-Crowd-Version, since the crowd version restarts at 0 on every start
+BOOT_ID = os.urandom(4).hex()
+
 # Thread lock for database and file operations
 file_lock = Lock()
 
+# In-memory crowd state: stalls and latest positions keyed by user_id, counts keyed by stall name
+crowd_state = {
+    "stalls": {},
+    "positions": {},
+    "counts": {},
+    "density": None,  # last /crowd_density payload
+    "version": 0,  # bumped on every recount, served as the ETag of crowd endpoints
+    "dirty": False
+}
+
+# Last ping time per user for suppressed writes (pruned after HEARTBEAT_MAX_AGE), plus location write counters
+heartbeats = {}
+location_stats = {"received": 0, "written": 0, "suppressed": 0}
+
+# Forecast model state per stall name: level, trend in people per minute and last sample time
+stall_forecasts = {}
+
+# Per-user stall presence (LRU ordered), dwell totals per stall and origin -> destination transition counts
+user_stall_state = OrderedDict()
+dwell_stats = defaultdict(lambda: {"visits": 0, "total_seconds": 0.0})
+flow_counts = defaultdict(dict)
+
+# Decayed arrival/departure event counts per stall and the latest wait estimate in minutes
+stall_rates = defaultdict(lambda: {"arrivals": 0.0, "departures": 0.0, "updated_at": None})
+wait_estimates = {}
+
 # Initialize SQLite database with necessary tables
 def init_db():
     with sqlite3.connect(DB_FILE) as conn:
@@ -55,6 +119,7 @@ def init_db():
             stall_name TEXT PRIMARY KEY,
             category TEXT
         )''')
+        create_spatial_index(cursor)
         conn.commit()
     print(f"[{datetime.utcnow().isoformat()}] Initialized SQLite database '{DB_FILE}'")
 
@@ -64,7 +129,7 @@ def initialize_csv():
         if not os.path.exists(USER_ID_INTERESTS_FILE):
             with open(USER_ID_INTERESTS_FILE, mode='w', newline='') as file:
                 writer = csv.writer(file)
-                writer.writerow(["id", "interests"])
+                writer.writerow(["id", "interests", "interests_mask"])
             print(f"[{datetime.utcnow().isoformat()}] Initialized {USER_ID_INTERESTS_FILE}")
         
         if not os.path.exists(STALL_PEOPLE_COUNT_FILE):
@@ -88,12 +153,15 @@ def initialize_csv():
         if not os.path.exists(STALL_CATEGORIES_FILE):
             with open(STALL_CATEGORIES_FILE, mode='w', newline='') as file:
                 writer = csv.writer(file)
-                writer.writerow(["stall_name", "category"])
+                writer.writerow(["stall_name", "category", "category_mask"])
                 writer.writerows([
-                    ["Food Stall", "Food"],
-                    ["Tech Stall", "Technology"],
-                    ["Merchandise Stall", "Products"],
-                    ["Game Stall", "Games"]
+                    [stall_name, category, encode_interests(category)]
+                    for stall_name, category in [
+                        ("Food Stall", "Food"),
+                        ("Tech Stall", "Technology"),
+                        ("Merchandise Stall", "Products"),
+                        ("Game Stall", "Games")
+                    ]
                 ])
             print(f"[{datetime.utcnow().isoformat()}] Initialized {STALL_CATEGORIES_FILE} with default data")
         else:
@@ -103,26 +171,289 @@ def initialize_csv():
 def home():
     return "Flask backend for EventHub crowd monitoring"
 
-# Update stall people count based on user locations
-def update_stall_people_count():
-    print(f"[{datetime.utcnow().isoformat()}] Recalculating crowd density...")
-    stalls = []
-    users = []
-    
+# Rebuild the in-memory crowd state from the CSV files (cold start)
+def load_state_from_csv():
+    stalls = {}
+    positions = {}
     with file_lock:
         if os.path.exists(STALLS_FILE):
             with open(STALLS_FILE, mode='r') as file:
                 reader = csv.reader(file)
-                next(reader)  # Skip header
-                stalls = [{'stall_id': row[0], 'stall_name': row[1], 'latitude': float(row[2]), 'longitude': float(row[3])}
-                          for row in reader if row and len(row) >= 4]
-        
+                next(reader, None)  # Skip header
+                for row in reader:
+                    if row and len(row) >= 4:
+                        stalls[row[0]] = {'stall_name': row[1], 'latitude': float(row[2]), 'longitude': float(row[3])}
+
         if os.path.exists(USER_LOCATIONS_FILE):
             with open(USER_LOCATIONS_FILE, mode='r') as file:
                 reader = csv.reader(file)
-                next(reader)  # Skip header
-                users = [{'user_id': row[0], 'latitude': float(row[1]), 'longitude': float(row[2])}
-                         for row in reader if row and len(row) >= 3]
+                next(reader, None)  # Skip header
+                for row in reader:
+                    if row and len(row) >= 3:
+                        positions[row[0]] = (float(row[1]), float(row[2]), row[3] if len(row) >= 4 else "")
+
+        crowd_state["stalls"] = stalls
+        crowd_state["positions"] = positions
+    print(f"[{datetime.utcnow().isoformat()}] Rebuilt crowd state from CSV: {len(stalls)} stalls, {len(positions)} positions")
+
+def _pack_str(value):
+    data = str(value).encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+def _unpack_str(buf, offset):
+    (length,) = struct.unpack_from("<H", buf, offset)
+    offset += 2
+    return bytes(buf[offset:offset + length]).decode("utf-8"), offset + length
+
+# Write a versioned binary snapshot of stalls, latest positions and counts
+def write_state_snapshot():
+    with file_lock:
+        # Taken under the lock so every log entry after this time is missing from the snapshot
+        snapshot_time = datetime.utcnow().isoformat()
+        version = crowd_state["version"]
+        stalls = dict(crowd_state["stalls"])
+        positions = dict(crowd_state["positions"])
+        counts = dict(crowd_state["counts"])
+
+    parts = [SNAPSHOT_MAGIC, struct.pack("<H", SNAPSHOT_VERSION), _pack_str(snapshot_time),
+             struct.pack("<III", len(stalls), len(positions), len(counts))]
+    for user_id, stall in stalls.items():
+        parts.append(_pack_str(user_id) + _pack_str(stall["stall_name"]) + struct.pack("<dd", stall["latitude"], stall["longitude"]))
+    for user_id, (latitude, longitude, timestamp) in positions.items():
+        parts.append(_pack_str(user_id) + struct.pack("<dd", latitude, longitude) + _pack_str(timestamp))
+    for stall_name, count in counts.items():
+        parts.append(_pack_str(stall_name) + struct.pack("<I", count))
+
+    # Write to a temporary file first so a crash never leaves a truncated snapshot behind
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(SNAPSHOT_FILE)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(b"".join(parts))
+        os.replace(tmp_path, SNAPSHOT_FILE)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Only a snapshot that reached disk clears the flag, and only if nothing changed while it was written
+    with file_lock:
+        if crowd_state["version"] == version:
+            crowd_state["dirty"] = False
+    print(f"[{datetime.utcnow().isoformat()}] Wrote crowd state snapshot ({len(stalls)} stalls, {len(positions)} positions)")
+    return snapshot_time
+
+# Load the binary snapshot into the in-memory crowd state, returns the snapshot time or None
+def load_state_snapshot():
+    if not os.path.exists(SNAPSHOT_FILE) or os.path.getsize(SNAPSHOT_FILE) == 0:
+        return None
+    try:
+        with open(SNAPSHOT_FILE, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if buf[:4] != SNAPSHOT_MAGIC:
+                    print(f"[{datetime.utcnow().isoformat()}] Ignoring snapshot with unknown format")
+                    return None
+                (version,) = struct.unpack_from("<H", buf, 4)
+                if version != SNAPSHOT_VERSION:
+                    print(f"[{datetime.utcnow().isoformat()}] Ignoring snapshot version {version}, expected {SNAPSHOT_VERSION}")
+                    return None
+                snapshot_time, offset = _unpack_str(buf, 6)
+                n_stalls, n_positions, n_counts = struct.unpack_from("<III", buf, offset)
+                offset += 12
+
+                stalls = {}
+                for _ in range(n_stalls):
+                    user_id, offset = _unpack_str(buf, offset)
+                    stall_name, offset = _unpack_str(buf, offset)
+                    latitude, longitude = struct.unpack_from("<dd", buf, offset)
+                    offset += 16
+                    stalls[user_id] = {'stall_name': stall_name, 'latitude': latitude, 'longitude': longitude}
+                positions = {}
+                for _ in range(n_positions):
+                    user_id, offset = _unpack_str(buf, offset)
+                    latitude, longitude = struct.unpack_from("<dd", buf, offset)
+                    offset += 16
+                    timestamp, offset = _unpack_str(buf, offset)
+                    positions[user_id] = (latitude, longitude, timestamp)
+                counts = {}
+                for _ in range(n_counts):
+                    stall_name, offset = _unpack_str(buf, offset)
+                    (count,) = struct.unpack_from("<I", buf, offset)
+                    offset += 4
+                    counts[stall_name] = count
+    except (OSError, ValueError, struct.error) as e:
+        print(f"[{datetime.utcnow().isoformat()}] Failed to read snapshot {SNAPSHOT_FILE}: {str(e)}")
+        return None
+
+    with file_lock:
+        crowd_state["stalls"] = stalls
+        crowd_state["positions"] = positions
+        crowd_state["counts"] = counts
+    print(f"[{datetime.utcnow().isoformat()}] Loaded crowd state snapshot from {snapshot_time}")
+    return snapshot_time
+
+# Replay location log entries written after the snapshot was taken
+def replay_location_log(since):
+    with sqlite3.connect(DB_FILE) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id, latitude, longitude, timestamp FROM user_locations WHERE timestamp > ?", (since,))
+        new_positions = cursor.fetchall()
+        cursor.execute("SELECT user_id, stall_name, latitude, longitude FROM stalls")
+        all_stalls = cursor.fetchall()
+
+    replayed = 0
+    with file_lock:
+        for user_id, latitude, longitude, timestamp in new_positions:
+            crowd_state["positions"][str(user_id)] = (latitude, longitude, timestamp)
+            replayed += 1
+        for user_id, stall_name, latitude, longitude in all_stalls:
+            if str(user_id) not in crowd_state["stalls"]:
+                crowd_state["stalls"][str(user_id)] = {'stall_name': stall_name, 'latitude': latitude, 'longitude': longitude}
+                replayed += 1
+    print(f"[{datetime.utcnow().isoformat()}] Replayed {replayed} log entries newer than {since}")
+    return replayed
+
+# Restore crowd state on startup: snapshot plus log replay, falling back to a full CSV rebuild
+def restore_crowd_state():
+    snapshot_time = load_state_snapshot()
+    if snapshot_time is None:
+        load_state_from_csv()
+        update_stall_people_count()
+    elif replay_location_log(snapshot_time) or not crowd_state["counts"]:
+        update_stall_people_count()
+
+# Drop heartbeats of users who stopped pinging, so the map only holds currently active users
+def prune_heartbeats(now):
+    cutoff = now - timedelta(seconds=HEARTBEAT_MAX_AGE)
+    with file_lock:
+        stale = [user_id for user_id, last_seen in heartbeats.items() if datetime.fromisoformat(last_seen) < cutoff]
+        for user_id in stale:
+            del heartbeats[user_id]
+    return len(stale)
+
+# Periodically persist the crowd state while it has unsaved changes and prune stale heartbeats
+def snapshot_worker():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        pruned = prune_heartbeats(datetime.utcnow())
+        if pruned:
+            print(f"[{datetime.utcnow().isoformat()}] Pruned {pruned} stale heartbeats")
+        if crowd_state["dirty"]:
+            try:
+                write_state_snapshot()
+            except OSError as e:
+                print(f"[{datetime.utcnow().isoformat()}] Error writing snapshot: {str(e)}")
+
+# Step the model once per elapsed sample interval; the count in effect over the interval is the latest recount
+def advance_forecast(model, now):
+    steps = int((now - model["updated_at"]).total_seconds() // FORECAST_SAMPLE_SECONDS)
+    if steps <= 0:
+        return
+    if steps > FORECAST_MAX_CATCHUP:
+        model["level"] = float(model["last_count"])
+        model["trend"] = 0.0
+        model["updated_at"] = now
+        return
+    for _ in range(steps):
+        level = FORECAST_ALPHA * model["last_count"] + (1 - FORECAST_ALPHA) * (model["level"] + FORECAST_DAMPING * model["trend"])
+        trend = FORECAST_BETA * (level - model["level"]) + (1 - FORECAST_BETA) * FORECAST_DAMPING * model["trend"]
+        model["trend"] = min(max(trend, -FORECAST_MAX_TREND), FORECAST_MAX_TREND)
+        model["level"] = level
+    model["updated_at"] += timedelta(seconds=steps * FORECAST_SAMPLE_SECONDS)
+
+# Record a recount; bursts within one sample interval only change the count the next step sees
+def update_forecast(stall_name, count, now):
+    model = stall_forecasts.get(stall_name)
+    if model is None:
+        stall_forecasts[stall_name] = {"level": float(count), "trend": 0.0, "last_count": count, "updated_at": now}
+        return
+    advance_forecast(model, now)
+    model["last_count"] = count
+
+# Predicted crowd count for a stall the given number of minutes after now: the current count plus the damped trend
+def forecast_count(stall_name, minutes, now=None):
+    model = stall_forecasts.get(stall_name)
+    if model is None:
+        return None
+    advance_forecast(model, now or datetime.utcnow())
+    steps = minutes * 60 / FORECAST_SAMPLE_SECONDS
+    damped_steps = FORECAST_DAMPING * (1 - FORECAST_DAMPING ** steps) / (1 - FORECAST_DAMPING)
+    return max(model["last_count"] + model["trend"] * damped_steps, 0.0)
+
+# Nearest stall within the crowd radius of a position, or None
+def find_current_stall(latitude, longitude):
+    best_stall = None
+    best_distance = STALL_RADIUS_METERS
+    for stall in crowd_state["stalls"].values():
+        distance = geodesic((stall["latitude"], stall["longitude"]), (latitude, longitude)).meters
+        if distance <= best_distance:
+            best_stall = stall["stall_name"]
+            best_distance = distance
+    return best_stall
+
+# Count a transition, keeping at most MAX_FLOWS_PER_STALL destinations per origin (space-saving eviction)
+def record_flow(origin, destination):
+    flows = flow_counts[origin]
+    if destination in flows:
+        flows[destination] += 1
+    elif len(flows) < MAX_FLOWS_PER_STALL:
+        flows[destination] = 1
+    else:
+        evicted = min(flows, key=flows.get)
+        flows[destination] = flows.pop(evicted) + 1
+
+# Record an arrival or departure in the stall's exponentially decayed event counts
+def record_stall_event(stall_name, kind, now):
+    rates = stall_rates[stall_name]
+    if rates["updated_at"] is not None:
+        factor = math.exp(-(now - rates["updated_at"]).total_seconds() / 60 / RATE_WINDOW_MINUTES)
+        rates["arrivals"] *= factor
+        rates["departures"] *= factor
+    rates["updated_at"] = now
+    rates[kind] += 1
+
+# Expected time in the stall's queue via Little's law: W = L / lambda
+def estimate_wait_minutes(stall_name, crowd_count, now):
+    rates = stall_rates.get(stall_name)
+    if not rates or rates["updated_at"] is None:
+        return None
+    factor = math.exp(-(now - rates["updated_at"]).total_seconds() / 60 / RATE_WINDOW_MINUTES)
+    arrivals = rates["arrivals"] * factor
+    departures = rates["departures"] * factor
+    # Departures are the throughput in steady state; average with arrivals once both are observed
+    events = (arrivals + departures) / 2 if departures > 0 else arrivals
+    throughput = events / RATE_WINDOW_MINUTES
+    if throughput <= 0:
+        return None
+    return round(crowd_count / throughput, 1)
+
+# Feed a stored location ping into the dwell and flow analytics
+def track_stall_visit(user_id, latitude, longitude, now):
+    current_stall = find_current_stall(latitude, longitude)
+    state = user_stall_state.pop(user_id, {"stall": None, "entered_at": None, "last_stall": None})
+    if current_stall != state["stall"]:
+        if state["stall"] is not None:
+            stats = dwell_stats[state["stall"]]
+            stats["visits"] += 1
+            stats["total_seconds"] += (now - state["entered_at"]).total_seconds()
+            record_stall_event(state["stall"], "departures", now)
+            state["last_stall"] = state["stall"]
+        if current_stall is not None:
+            record_stall_event(current_stall, "arrivals", now)
+            if state["last_stall"] not in (None, current_stall):
+                record_flow(state["last_stall"], current_stall)
+        state["stall"] = current_stall
+        state["entered_at"] = now
+    user_stall_state[user_id] = state
+    while len(user_stall_state) > MAX_TRACKED_USERS:
+        user_stall_state.popitem(last=False)
+
+# Update stall people count based on user locations
+def update_stall_people_count():
+    print(f"[{datetime.utcnow().isoformat()}] Recalculating crowd density...")
+
+    with file_lock:
+        stalls = list(crowd_state["stalls"].values())
+        users = [{'latitude': latitude, 'longitude': longitude}
+                 for latitude, longitude, _ in crowd_state["positions"].values()]
     
     if not stalls:
         print(f"[{datetime.utcnow().isoformat()}] No stalls found, returning default response")
@@ -131,7 +462,7 @@ def update_stall_people_count():
     stall_crowd = {}
     for stall in stalls:
         count = sum(1 for user in users if geodesic((stall["latitude"], stall["longitude"]),
-                                                    (user["latitude"], user["longitude"])).meters <= 50)
+                                                    (user["latitude"], user["longitude"])).meters <= STALL_RADIUS_METERS)
         level = "Very Low" if count <= 1 else "Low" if count <= 3 else "Medium" if count <= 5 else "High" if count <= 7 else "Very High"
         stall_crowd[stall["stall_name"]] = {
             "crowd_count": count,
@@ -140,7 +471,21 @@ def update_stall_people_count():
             "longitude": stall["longitude"]
         }
     
+    now = datetime.utcnow()
     with file_lock:
+        crowd_state["counts"] = {stall_name: details["crowd_count"] for stall_name, details in stall_crowd.items()}
+        # Little's law needs L counted like the arrival/departure rates: each user at their single nearest stall
+        present = defaultdict(int)
+        for state in user_stall_state.values():
+            if state["stall"] is not None:
+                present[state["stall"]] += 1
+        for stall_name, details in stall_crowd.items():
+            update_forecast(stall_name, details["crowd_count"], now)
+            wait_estimates[stall_name] = estimate_wait_minutes(stall_name, present[stall_name], now)
+            details["wait_minutes"] = wait_estimates[stall_name]
+        crowd_state["density"] = stall_crowd
+        crowd_state["version"] += 1
+        crowd_state["dirty"] = True
         with open(STALL_PEOPLE_COUNT_FILE, mode='w', newline='') as file:
             writer = csv.writer(file)
             writer.writerow(["stall_name", "people_count"])
@@ -150,87 +495,108 @@ def update_stall_people_count():
     print(f"[{datetime.utcnow().isoformat()}] Crowd density updated: {stall_crowd}")
     return stall_crowd
 
-# Retrieve user interests from CSV
-def get_user_interests_from_csv(user_id):
+# Retrieve the user's interest bitmask from CSV, encoding the text column for rows written without one
+def get_user_interest_mask(user_id):
     if not os.path.exists(USER_ID_INTERESTS_FILE):
         print(f"[{datetime.utcnow().isoformat()}] {USER_ID_INTERESTS_FILE} not found")
-        return set()
+        return 0
     
     with file_lock:
         with open(USER_ID_INTERESTS_FILE, mode='r') as file:
             reader = csv.reader(file)
             next(reader)  # Skip header
             for row in reader:
-                if row[0] == str(user_id):
-                    interests = row[1].split(",") if row[1] else []
-                    print(f"[{datetime.utcnow().isoformat()}] Found interests for user {user_id}: {interests}")
-                    return set(interest.strip().lower() for interest in interests)
+                if row and row[0] == str(user_id):
+                    mask = int(float(row[2])) if len(row) >= 3 and row[2] else encode_interests(row[1] if len(row) >= 2 else "")
+                    print(f"[{datetime.utcnow().isoformat()}] Found interests for user {user_id}: {decode_mask(mask)}")
+                    return mask
     print(f"[{datetime.utcnow().isoformat()}] No interests found for user {user_id}")
-    return set()
+    return 0
 
-# Retrieve stall categories from CSV
-def get_stall_categories():
-    categories = {}
+# Retrieve stall category bitmasks from CSV, keyed by lowercased stall name
+def get_stall_category_masks():
+    masks = {}
     if os.path.exists(STALL_CATEGORIES_FILE):
         with file_lock:
             with open(STALL_CATEGORIES_FILE, mode='r') as file:
                 reader = csv.reader(file)
                 next(reader)  # Skip header
                 for row in reader:
-                    categories[row[0].lower()] = row[1].lower() if row[1] else ""
-            print(f"[{datetime.utcnow().isoformat()}] Loaded {len(categories)} stall categories from {STALL_CATEGORIES_FILE}")
+                    if row:
+                        masks[row[0].lower()] = int(float(row[2])) if len(row) >= 3 and row[2] else encode_interests(row[1] if len(row) >= 2 else "")
+            print(f"[{datetime.utcnow().isoformat()}] Loaded {len(masks)} stall categories from {STALL_CATEGORIES_FILE}")
     else:
         print(f"[{datetime.utcnow().isoformat()}] Warning: {STALL_CATEGORIES_FILE} not found")
-    return categories
+    return masks
 
-# Suggest the best stall based on crowd density and user interests
-def suggest_best_stall(user_id):
-    stall_counts = {}
-    if os.path.exists(STALL_PEOPLE_COUNT_FILE):
-        with file_lock:
-            with open(STALL_PEOPLE_COUNT_FILE, mode='r') as file:
-                reader = csv.reader(file)
-                next(reader)  # Skip header
-                for row in reader:
-                    if len(row) >= 2:
-                        stall_counts[row[0]] = int(row[1] if row[1] else 0)
+# Suggest the best stall by crowd (current or forecast), interest match and walking distance
+def suggest_best_stall(user_id, rank_by="crowd", horizon=15, weights=None, top_n=DEFAULT_TOP_N):
+    with file_lock:
+        stall_counts = dict(crowd_state["counts"])
+        stall_positions = {stall["stall_name"]: (stall["latitude"], stall["longitude"]) for stall in crowd_state["stalls"].values()}
+        user_position = crowd_state["positions"].get(str(user_id))
+        if rank_by == "forecast":
+            for stall_name in stall_counts:
+                predicted = forecast_count(stall_name, horizon)
+                if predicted is not None:
+                    stall_counts[stall_name] = round(predicted, 1)
     
     if not stall_counts:
-        print(f"[{datetime.utcnow().isoformat()}] No stall data found in {STALL_PEOPLE_COUNT_FILE} for user {user_id}")
+        print(f"[{datetime.utcnow().isoformat()}] No stall data found for user {user_id}")
         return {"stall": None, "reason": "No stall data available"}
     
-    user_interests = get_user_interests_from_csv(user_id)
-    if not user_interests:
-        print(f"[{datetime.utcnow().isoformat()}] No interests found for user {user_id}")
-        return {"stall": None, "reason": "No user interests available"}
+    user_mask = get_user_interest_mask(user_id)
+    if not user_mask:
+        print(f"[{datetime.utcnow().isoformat()}] No interests found for user {user_id}, ranking by crowd and distance only")
+    if user_position is None:
+        print(f"[{datetime.utcnow().isoformat()}] No stored location for user {user_id}, ranking without distance")
 
-    stall_categories = get_stall_categories()
-    
-    best_stall = None
-    best_reason = "No suitable stall found"
-    min_crowd = float('inf')
-    best_interest_match = None
-    
-    for stall_name, crowd_count in stall_counts.items():
-        interest_score = 0
-        if stall_name.lower() in stall_categories:
-            stall_cat = stall_categories[stall_name.lower()]
-            if stall_cat in user_interests:
-                interest_score = 2
-            elif any(cat in stall_cat for cat in user_interests):
-                interest_score = 1
-        
-        if crowd_count < min_crowd or (crowd_count == min_crowd and interest_score > (best_interest_match or 0)):
-            min_crowd = crowd_count
-            best_stall = stall_name
-            best_interest_match = interest_score
-            if interest_score > 0:
-                best_reason = f"Recommended due to low crowd ({crowd_count} people) and matching {stall_cat} interest"
-            else:
-                best_reason = f"Recommended due to low crowd ({crowd_count} people)"
+    stall_masks = get_stall_category_masks()
+    stall_names = list(stall_counts)
+    positions = [stall_positions.get(stall_name, (math.nan, math.nan)) for stall_name in stall_names]
+    ranking = score_stalls(
+        stall_names,
+        [stall_counts[stall_name] for stall_name in stall_names],
+        [stall_masks.get(stall_name.lower(), 0) for stall_name in stall_names],
+        [position[0] for position in positions],
+        [position[1] for position in positions],
+        user_mask=user_mask,
+        user_position=user_position[:2] if user_position else None,
+        weights=weights,
+        top_n=top_n
+    )
+    for entry in ranking:
+        entry["wait_minutes"] = wait_estimates.get(entry["stall"])
+
+    best = ranking[0]
+    crowd_label = f"forecast crowd in {horizon} min" if rank_by == "forecast" else "crowd"
+    # Describe each component that contributed, leading with the one that decided the pick
+    reasons = {}
+    if best["crowd_score"] > 0:
+        reasons["crowd"] = f"low {crowd_label} ({best['crowd_count']:g} people)"
+    if best["shared_categories"]:
+        reasons["interest"] = f"matching {', '.join(decode_mask(stall_masks[best['stall'].lower()] & user_mask))} interest"
+    if best["walk_minutes"] is not None and best["distance_score"] > 0:
+        reasons["distance"] = f"{best['walk_minutes']} min walk ({best['distance_meters']:.0f} m)"
+    if best["dominant"] in reasons:
+        ordered = [reasons.pop(best["dominant"])] + list(reasons.values())
+        best_reason = "Recommended mainly due to " + " and ".join(ordered)
+    else:
+        best_reason = f"Recommended as the best available stall ({best['crowd_count']:g} people)"
     
-    print(f"[{datetime.utcnow().isoformat()}] Suggesting stall for user {user_id}: {best_stall}, reason: {best_reason}")
-    return {"stall": best_stall, "reason": best_reason}
+    print(f"[{datetime.utcnow().isoformat()}] Suggesting stall for user {user_id}: {best['stall']}, reason: {best_reason}")
+    return {"stall": best["stall"], "reason": best_reason, "wait_minutes": best["wait_minutes"], "ranking": ranking}
+
+# Check whether a ping is within the dead-band of the last stored position and that write is still recent
+def is_redundant_ping(last_position, latitude, longitude, now):
+    last_latitude, last_longitude, last_timestamp = last_position
+    try:
+        age = (now - datetime.fromisoformat(last_timestamp)).total_seconds()
+    except (ValueError, TypeError):
+        return False
+    if age > DEADBAND_MAX_AGE:
+        return False
+    return geodesic((last_latitude, last_longitude), (latitude, longitude)).meters <= DEADBAND_METERS
 
 @app.route("/save-location", methods=["POST"])
 def save_location():
@@ -266,23 +632,38 @@ def save_location():
             if not stall_name:
                 print(f"[{datetime.utcnow().isoformat()}] Error: Stall name required")
                 return jsonify({"error": "Stall name required for stall owners"}), 400
-            stall_exists = any(row[0] == str(user_id) for row in csv.reader(open(STALLS_FILE, "r")) if row) if os.path.exists(STALLS_FILE) else False
+            stall_exists = str(user_id) in crowd_state["stalls"]
             if not stall_exists:
+                # The in-memory state may predate this stall (e.g. an empty restore), so the table is authoritative
                 with sqlite3.connect(DB_FILE) as conn:
                     cursor = conn.cursor()
-                    cursor.execute("INSERT INTO stalls (user_id, stall_name, latitude, longitude) VALUES (?, ?, ?, ?)",
-                                   (user_id, stall_name, latitude, longitude))
-                    conn.commit()
-                with open(STALLS_FILE, mode='a', newline='') as file:
-                    writer = csv.writer(file)
-                    writer.writerow([user_id, stall_name, latitude, longitude])
-                print(f"[{datetime.utcnow().isoformat()}] Registered stall for user {user_id}: {stall_name}")
-                update_stall_people_count()
-                return jsonify({"message": "Stall location stored successfully", "latitude": latitude, "longitude": longitude}), 200
-            print(f"[{datetime.utcnow().isoformat()}] Stall already registered for user {user_id}")
-            return jsonify({"message": "Stall already registered"}), 200
+                    cursor.execute("SELECT stall_name, latitude, longitude FROM stalls WHERE user_id = ?", (user_id,))
+                    row = cursor.fetchone()
+                if row:
+                    crowd_state["stalls"][str(user_id)] = {'stall_name': row[0], 'latitude': row[1], 'longitude': row[2]}
+                    stall_exists = True
+            if stall_exists:
+                print(f"[{datetime.utcnow().isoformat()}] Stall already registered for user {user_id}")
+                return jsonify({"message": "Stall already registered"}), 200
+            with sqlite3.connect(DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO stalls (user_id, stall_name, latitude, longitude) VALUES (?, ?, ?, ?)",
+                               (user_id, stall_name, latitude, longitude))
+                conn.commit()
+            with open(STALLS_FILE, mode='a', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow([user_id, stall_name, latitude, longitude])
+            crowd_state["stalls"][str(user_id)] = {'stall_name': stall_name, 'latitude': latitude, 'longitude': longitude}
+            print(f"[{datetime.utcnow().isoformat()}] Registered stall for user {user_id}: {stall_name}")
         else:
-            timestamp = datetime.utcnow().isoformat()
+            now = datetime.utcnow()
+            location_stats["received"] += 1
+            last_position = crowd_state["positions"].get(str(user_id))
+            if last_position and is_redundant_ping(last_position, latitude, longitude, now):
+                heartbeats[str(user_id)] = now.isoformat()
+                location_stats["suppressed"] += 1
+                return jsonify({"message": "Location unchanged", "latitude": last_position[0], "longitude": last_position[1]}), 200
+            timestamp = now.isoformat()
             with sqlite3.connect(DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute("REPLACE INTO user_locations (user_id, latitude, longitude, timestamp) VALUES (?, ?, ?, ?)",
@@ -306,21 +687,87 @@ def save_location():
             with open(USER_LOCATIONS_FILE, "w", newline='') as file:
                 writer = csv.writer(file)
                 writer.writerows(all_rows)
+            crowd_state["positions"][str(user_id)] = (latitude, longitude, timestamp)
+            heartbeats[str(user_id)] = timestamp
+            location_stats["written"] += 1
+            track_stall_visit(str(user_id), latitude, longitude, now)
             print(f"[{datetime.utcnow().isoformat()}] Updated location for user {user_id}: {latitude}, {longitude}")
     
     update_stall_people_count()
+    if is_stall_owner:
+        return jsonify({"message": "Stall location stored successfully", "latitude": latitude, "longitude": longitude}), 200
     return jsonify({"message": "Location updated successfully", "latitude": latitude, "longitude": longitude}), 200
 
+# Every response carries the crowd version so clients can expire cached GETs
+@app.after_request
+def add_crowd_version(response):
+    response.headers["X-Crowd-Version"] = f'{BOOT_ID}-{crowd_state["version"]}'
+    return response
+
+# JSON response tagged with the crowd version (plus an optional extra tag), or 304 if the client already has it
+def versioned_response(payload, tag=None):
+    etag = f'"{BOOT_ID}-{crowd_state["version"]}"' if tag is None else f'"{BOOT_ID}-{crowd_state["version"]}-{tag}"'
+    if request.headers.get("If-None-Match") == etag:
+        return "", 304, {"ETag": etag}
+    response = jsonify(payload)
+    response.headers["ETag"] = etag
+    return response, 200
+
 @app.route("/crowd_density", methods=["GET"])
 def crowd_density():
     try:
-        print(f"[{datetime.utcnow().isoformat()}] Calculating crowd density...")
-        stall_crowd = update_stall_people_count()
-        return jsonify(stall_crowd), 200
+        # Counts are kept current by /save-location, so only compute here if nothing has been counted yet
+        stall_crowd = crowd_state["density"]
+        if stall_crowd is None:
+            print(f"[{datetime.utcnow().isoformat()}] Calculating crowd density...")
+            stall_crowd = update_stall_people_count()
+        return versioned_response(stall_crowd)
     except Exception as e:
         print(f"[{datetime.utcnow().isoformat()}] Error in crowd_density endpoint: {str(e)}")
         return jsonify({"error": f"Failed to calculate crowd density: {str(e)}"}), 500
 
+@app.route("/crowd_forecast", methods=["GET"])
+def crowd_forecast():
+    now = datetime.utcnow()
+    with file_lock:
+        forecasts = {
+            stall_name: {
+                "crowd_count": count,
+                "forecast": {str(minutes): round(forecast_count(stall_name, minutes, now), 1)
+                             for minutes in FORECAST_HORIZONS if stall_name in stall_forecasts}
+            }
+            for stall_name, count in crowd_state["counts"].items()
+        }
+    # Forecasts move with the clock as well as with recounts
+    return versioned_response(forecasts, tag=int(now.timestamp() // FORECAST_SAMPLE_SECONDS))
+
+@app.route("/stall_flows", methods=["GET"])
+def stall_flows():
+    try:
+        top = int(request.args.get("top", 3))
+    except (ValueError, TypeError):
+        return jsonify({"error": "top must be a number"}), 400
+    with file_lock:
+        stall_names = set(dwell_stats) | set(flow_counts)
+        analytics = {}
+        for stall_name in stall_names:
+            stats = dwell_stats.get(stall_name, {"visits": 0, "total_seconds": 0.0})
+            flows = flow_counts.get(stall_name, {})
+            analytics[stall_name] = {
+                "visits": stats["visits"],
+                "avg_dwell_seconds": round(stats["total_seconds"] / stats["visits"], 1) if stats["visits"] else None,
+                "top_flows": [{"to": destination, "count": count}
+                              for destination, count in sorted(flows.items(), key=lambda item: item[1], reverse=True)[:top]]
+            }
+    return versioned_response(analytics)
+
+@app.route("/location_stats", methods=["GET"])
+def get_location_stats():
+    with file_lock:
+        stats = dict(location_stats)
+        stats["active_users"] = len(heartbeats)
+    return jsonify(stats), 200
+
 @app.route("/suggest_stall", methods=["POST"])
 def suggest_stall():
     data = request.json
@@ -330,12 +777,44 @@ def suggest_stall():
         print(f"[{datetime.utcnow().isoformat()}] Error: User ID is required")
         return jsonify({"error": "User ID is required"}), 400
     
-    suggestion = suggest_best_stall(user_id)
+    rank_by = data.get("rank_by", "crowd")
+    if rank_by not in ("crowd", "forecast"):
+        print(f"[{datetime.utcnow().isoformat()}] Error: Invalid rank_by {rank_by}")
+        return jsonify({"error": "rank_by must be 'crowd' or 'forecast'"}), 400
+    try:
+        horizon = int(data.get("horizon", 15))
+    except (ValueError, TypeError):
+        return jsonify({"error": "horizon must be a number of minutes"}), 400
+    if not 0 < horizon <= FORECAST_MAX_HORIZON:
+        print(f"[{datetime.utcnow().isoformat()}] Error: Invalid horizon {horizon}")
+        return jsonify({"error": f"horizon must be between 1 and {FORECAST_MAX_HORIZON} minutes"}), 400
+    
+    try:
+        top_n = int(data.get("top", DEFAULT_TOP_N))
+    except (ValueError, TypeError):
+        return jsonify({"error": "top must be a number of stalls"}), 400
+    weights = data.get("weights")
+    if weights is not None and not isinstance(weights, dict):
+        return jsonify({"error": "weights must be an object of crowd/interest/distance weights"}), 400
+    
+    try:
+        suggestion = suggest_best_stall(user_id, rank_by=rank_by, horizon=horizon, weights=weights, top_n=top_n)
+    except ValueError as e:
+        print(f"[{datetime.utcnow().isoformat()}] Error: Invalid weights {weights}: {e}")
+        return jsonify({"error": str(e)}), 400
     print(f"[{datetime.utcnow().isoformat()}] Suggestion for user {user_id}: {suggestion}")
     return jsonify(suggestion), 200
 
-if __name__ == "__main__":
-    print(f"[{datetime.utcnow().isoformat()}] Starting Flask server...")
+# Prepare storage, restore the crowd state and start the snapshot thread once per process,
+# so `flask run` and WSGI servers serve the same state as running this file directly
+def setup_app():
     init_db()
     initialize_csv()
+    restore_crowd_state()
+    Thread(target=snapshot_worker, daemon=True).start()
+
+setup_app()
+
+if __name__ == "__main__":
+    print(f"[{datetime.utcnow().isoformat()}] Starting Flask server...")
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
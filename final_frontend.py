@@ -1,24 +1,38 @@
 import sqlite3
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import os
 import requests
-from textblob import TextBlob
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime
 from streamlit_option_menu import option_menu
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
 import folium
-import math
 import csv
+import re
 from groq import Groq
 import logging
 import tempfile
 import json
 import time
+from collections import OrderedDict
+from threading import Lock
 from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
+import trend_scores
+import event_similarity
+import sentiment_service
+import feedback_stats
+import llm_cache
+import feedback_summary
+import chat_context
+import chat_router
+from interest_bits import CATEGORIES, encode_interests, decode_mask
+from spatial_index import create_spatial_index, bounding_box
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, filename='app.log', filemode='a', format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -29,13 +43,27 @@ GROQ_API_KEY = "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"
 co = Groq(api_key=GROQ_API_KEY)
 
 # Constants
-CATEGORIES = ["Technology", "Music", "Sports", "Art", "Business", "Games", "Movies", "Food", "Products"]
 MOOD_MAPPING = {"positive": ["Sports", "Music", "Games"], "negative": ["Art"], "neutral": CATEGORIES}
 FEEDBACK_FILE = "feedback.csv"
 USER_LOCATIONS_FILE = "user_locations.csv"
 STALLS_FILE = "stalls.csv"
 BACKEND_URL = "http://127.0.0.1:5000"
 STALLS = ["Food Stall", "Tech Stall", "Merchandise Stall", "Game Stall"]
+CROWD_RADIUS_METERS = 50
+CACHE_TTL = 300  # seconds cached reads stay valid without an invalidating write
+BACKEND_GET_TTL = 5  # seconds a cached backend GET is served without revalidation
+BACKEND_CACHE_MAX_ENTRIES = 256  # least recently used backend GET responses are evicted beyond this
+EVENTS_PAGE_SIZE = 20
+GEOLOCATION_TIMEOUT_MS = 10000  # browser fix deadline before falling back to IP location
+GEOLOCATION_ACCURACY_THRESHOLD = 1000  # meters
+
+# Bidirectional component that returns the browser's geolocation fix to Python
+geolocation_component = components.declare_component(
+    "geolocation", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "geolocation_component")
+)
+LLM_CACHE_TTL = 24 * 3600  # seconds; feedback analyses are also invalidated by the event's feedback version
+CHAT_CACHE_TTL = 3600  # seconds an identical chat turn is answered from the cache
+CHAT_TITLE_CANDIDATES = 20  # best full-text title matches checked for an event named in a chat message
 
 # Database connection
 def get_db_connection():
@@ -43,6 +71,124 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+# Full-text index over event title/description/venue/category, kept in sync by triggers
+def create_event_search_index(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")
+    exists = cursor.fetchone() is not None
+    cursor.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+        title, description, venue, category, content='events', content_rowid='id'
+    )""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts(rowid, title, description, venue, category)
+        VALUES (NEW.id, NEW.title, NEW.description, NEW.venue, NEW.category);
+    END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, title, description, venue, category)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.venue, OLD.category);
+    END""")
+    cursor.execute("""CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, title, description, venue, category)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.venue, OLD.category);
+        INSERT INTO events_fts(rowid, title, description, venue, category)
+        VALUES (NEW.id, NEW.title, NEW.description, NEW.venue, NEW.category);
+    END""")
+    if not exists:
+        cursor.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+
+# Encode existing text interests/categories into their bitmask columns
+def backfill_interest_masks(cursor):
+    cursor.execute("SELECT id, interests FROM users")
+    cursor.executemany("UPDATE users SET interests_mask = ? WHERE id = ?",
+                       [(encode_interests(row[1]), row[0]) for row in cursor.fetchall()])
+    cursor.execute("SELECT id, category FROM events")
+    cursor.executemany("UPDATE events SET category_mask = ? WHERE id = ?",
+                       [(encode_interests(row[1]), row[0]) for row in cursor.fetchall()])
+
+# Seed the feedback aggregates from the existing feedback CSV
+def backfill_feedback_aggregates(cursor):
+    df = pd.read_csv(FEEDBACK_FILE) if os.path.exists(FEEDBACK_FILE) else pd.DataFrame(columns=["feedback", "event", "rating", "response"])
+    df = df.dropna(subset=["event", "rating"])
+    sentiments = sentiment_service.polarities(df["feedback"].fillna("").astype(str).tolist())
+    responded = [isinstance(response, str) and response != "" for response in df["response"]]
+    feedback_stats.rebuild_aggregates(cursor, zip(df["event"].astype(str), df["rating"], sentiments, responded))
+
+# Copy feedback.csv rows into the feedback table; the CSV is left in place as a backup
+def import_feedback_csv(cursor):
+    if not os.path.exists(FEEDBACK_FILE):
+        return
+    df = pd.read_csv(FEEDBACK_FILE).dropna(subset=["event", "rating"])
+    text = lambda value: value if isinstance(value, str) else ""
+    cursor.executemany("INSERT INTO feedback (name, feedback, event, rating, response) VALUES (?, ?, ?, ?, ?)",
+                       [(text(row.name), text(row.feedback), str(row.event), int(row.rating), text(row.response))
+                        for row in df.itertuples(index=False)])
+
+# Schema migrations applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    # 1: indexes for registration/event lookups and one registration per user and event.
+    # The unique (user_id, event_id) index also serves lookups by user_id alone.
+    [
+        "DELETE FROM registrations WHERE id NOT IN (SELECT MIN(id) FROM registrations GROUP BY user_id, event_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_registrations_user_event ON registrations(user_id, event_id)",
+        "CREATE INDEX IF NOT EXISTS idx_registrations_event ON registrations(event_id)",
+        "CREATE INDEX IF NOT EXISTS idx_events_category_date ON events(category, date)"
+    ],
+    # 2: materialized per-user category trend scores, backfilled from existing registrations
+    [
+        trend_scores.USER_CATEGORY_SCORES_SCHEMA,
+        trend_scores.rebuild_scores
+    ],
+    # 3: trend recommendations precomputed by `python trend_scores.py precompute`
+    [
+        trend_scores.TREND_RECOMMENDATIONS_SCHEMA
+    ],
+    # 4: item-to-item co-registration counts and top-k similar events, backfilled from registrations
+    event_similarity.EVENT_SIMILARITY_SCHEMA + [event_similarity.rebuild_similarity],
+    # 5: interest and category bitmasks over CATEGORIES, stored alongside the text columns
+    [
+        "ALTER TABLE users ADD COLUMN interests_mask INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE events ADD COLUMN category_mask INTEGER NOT NULL DEFAULT 0",
+        backfill_interest_masks
+    ],
+    # 6: per-event feedback totals (count, rating histogram and sum, sentiment sum, replies)
+    [feedback_stats.FEEDBACK_AGGREGATES_SCHEMA, backfill_feedback_aggregates],
+    # 7: feedback moves from feedback.csv to an indexed table with append inserts and in-place replies
+    [
+        '''CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            feedback TEXT,
+            event TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            response TEXT DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_feedback_event_rating ON feedback(event, rating)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_rating ON feedback(rating)",
+        import_feedback_csv
+    ],
+    # 8: per-event feedback version, bumped on every feedback change to invalidate cached analyses
+    [feedback_stats.ensure_version_column]
+]
+
+def run_migrations(conn):
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            cursor.execute("BEGIN")
+            for statement in statements:
+                # Plain SQL, or a callable for steps that need Python (e.g. backfills)
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            logger.info(f"Applied database migration {number}")
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
 # Initialize database
 def init_db():
     try:
@@ -88,7 +234,10 @@ def init_db():
             stall_name TEXT PRIMARY KEY,
             category TEXT
         )''')
+        create_spatial_index(cursor)
+        create_event_search_index(cursor)
         conn.commit()
+        run_migrations(conn)
         conn.close()
         logger.info("Database initialized successfully.")
     except Exception as e:
@@ -98,14 +247,11 @@ def init_db():
 # CSV Initialization
 def initialize_csv():
     try:
-        if not os.path.exists(FEEDBACK_FILE):
-            pd.DataFrame(columns=["name", "feedback", "event", "rating", "response"]).to_csv(FEEDBACK_FILE, index=False)
-            logger.info("Initialized feedback CSV file.")
         if not os.path.exists("user_interests.csv"):
-            pd.DataFrame(columns=["id", "name", "email", "interests"]).to_csv("user_interests.csv", index=False)
+            pd.DataFrame(columns=["id", "name", "email", "interests", "interests_mask"]).to_csv("user_interests.csv", index=False)
             logger.info("Initialized user interests CSV file.")
         if not os.path.exists("user_id_interests.csv"):
-            pd.DataFrame(columns=["id", "interests"]).to_csv("user_id_interests.csv", index=False)
+            pd.DataFrame(columns=["id", "interests", "interests_mask"]).to_csv("user_id_interests.csv", index=False)
             logger.info("Initialized user ID and interests CSV file.")
         if not os.path.exists("stall_people_count.csv"):
             pd.DataFrame(columns=["stall_name", "people_count"]).to_csv("stall_people_count.csv", index=False)
@@ -120,19 +266,59 @@ def initialize_csv():
         logger.error(f"Error initializing CSV files: {str(e)}")
         st.error(f"CSV initialization failed: {str(e)}")
 
+# Shared HTTP session with keep-alive pooling and bounded retries with backoff.
+# POSTs are not idempotent, so they are only retried on connection errors (urllib3 retries those for any method).
+@st.cache_resource
+def get_http_session():
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Cached backend GET responses keyed by endpoint and params (LRU, shared by all sessions), plus the latest crowd version seen
+@st.cache_resource
+def get_backend_cache():
+    return {"entries": OrderedDict(), "version": None, "lock": Lock()}
+
 # Proxy function to forward requests to the backend
-@st.cache_data(show_spinner="Processing backend request...")
 def proxy_to_backend(endpoint, method="POST", json_data=None):
     backend_url = f"{BACKEND_URL}{endpoint}"
+    session = get_http_session()
+    cache = get_backend_cache()
     try:
         if method == "POST":
             logger.debug(f"Sending to backend: {json_data}")
-            response = requests.post(backend_url, json=json_data, timeout=5)
+            response = session.post(backend_url, json=json_data, timeout=5)
         else:
-            response = requests.get(backend_url, params=json_data, timeout=5)
+            # Only idempotent GETs are cached; entries expire when the backend's crowd version moves on
+            key = (endpoint, tuple(sorted((json_data or {}).items())))
+            with cache["lock"]:
+                entry = cache["entries"].get(key)
+                if entry:
+                    cache["entries"].move_to_end(key)
+            if entry and entry["version"] == cache["version"] and time.time() - entry["fetched_at"] < BACKEND_GET_TTL:
+                return entry["data"]
+            headers = {"If-None-Match": entry["etag"]} if entry and entry["etag"] else {}
+            response = session.get(backend_url, params=json_data, headers=headers, timeout=5)
+            if response.status_code == 304 and entry:
+                entry["fetched_at"] = time.time()
+                entry["version"] = response.headers.get("X-Crowd-Version", entry["version"])
+                cache["version"] = entry["version"]
+                return entry["data"]
         response.raise_for_status()
+        cache["version"] = response.headers.get("X-Crowd-Version", cache["version"])
         logger.debug(f"Received from backend: {response.text}")
-        return response.json()
+        data = response.json()
+        if method != "POST":
+            with cache["lock"]:
+                cache["entries"][key] = {"data": data, "etag": response.headers.get("ETag"),
+                                         "version": cache["version"], "fetched_at": time.time()}
+                cache["entries"].move_to_end(key)
+                while len(cache["entries"]) > BACKEND_CACHE_MAX_ENTRIES:
+                    cache["entries"].popitem(last=False)
+        return data
     except requests.exceptions.RequestException as e:
         logger.error(f"Proxy error: {str(e)}")
         st.error(f"Proxy error: {str(e)}")
@@ -179,47 +365,243 @@ def get_fallback_location():
         return None, None
 
 # Feedback Functions
-def load_feedback():
-    if os.path.exists(FEEDBACK_FILE):
-        return pd.read_csv(FEEDBACK_FILE)
-    return pd.DataFrame(columns=["name", "feedback", "event", "rating", "response"])
+FEEDBACK_COLUMNS = "id, name, feedback, event, rating, response, created_at"
+
+# Feedback for one event or stall via idx_feedback_event_rating, optionally only entries without a reply
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_feedback_for_event(event, unanswered_only=False):
+    conn = get_db_connection()
+    query = f"SELECT {FEEDBACK_COLUMNS} FROM feedback WHERE event = ?"
+    if unanswered_only:
+        query += " AND (response IS NULL OR response = '')"
+    df = pd.read_sql_query(query + " ORDER BY id", conn, params=(event,), index_col="id")
+    conn.close()
+    return df
+
+def feedback_sentiment(text):
+    return sentiment_service.polarity(text) if isinstance(text, str) else 0.0
+
+# Append one feedback entry and fold it into the event's aggregates in the same transaction
+def add_feedback(name, feedback, event, rating):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO feedback (name, feedback, event, rating, response) VALUES (?, ?, ?, ?, '')",
+                   (name, feedback, event, rating))
+    feedback_stats.add_feedback(cursor, event, rating, feedback_sentiment(feedback))
+    conn.commit()
+    conn.close()
+    invalidate_feedback_caches()
 
-def save_feedback(df):
-    df.to_csv(FEEDBACK_FILE, index=False)
+# Set the reply on one entry; only a first reply counts towards the event's reply total
+def respond_to_feedback(feedback_id, response):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT event, response FROM feedback WHERE id = ?", (feedback_id,))
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute("UPDATE feedback SET response = ? WHERE id = ?", (response, feedback_id))
+        if not row["response"] and response:
+            feedback_stats.record_response(cursor, row["event"])
+        conn.commit()
+    conn.close()
+    invalidate_feedback_caches()
+
+def delete_feedback(feedback_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT event, rating, feedback, response FROM feedback WHERE id = ?", (feedback_id,))
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute("DELETE FROM feedback WHERE id = ?", (feedback_id,))
+        feedback_stats.remove_feedback(cursor, row["event"], row["rating"], feedback_sentiment(row["feedback"]), bool(row["response"]))
+        conn.commit()
+    conn.close()
+    invalidate_feedback_caches()
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_feedback_aggregate(event):
+    conn = get_db_connection()
+    aggregate = feedback_stats.get_aggregate(conn.cursor(), event)
+    conn.close()
+    return aggregate
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_feedback_version(event):
+    conn = get_db_connection()
+    version = feedback_stats.get_version(conn.cursor(), event)
+    conn.close()
+    return version
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_feedback_events():
+    conn = get_db_connection()
+    events = feedback_stats.get_feedback_events(conn.cursor())
+    conn.close()
+    return events
+
+# Drop every cached feedback read after feedback is added, answered or deleted
+def invalidate_feedback_caches():
+    get_feedback_for_event.clear()
+    get_feedback_aggregate.clear()
+    get_feedback_version.clear()
+    get_feedback_events.clear()
 
 # Database Utility Functions
+# Cached reads return plain dicts since sqlite3.Row objects cannot be pickled by st.cache_data
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def get_all_events():
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM events ORDER BY id DESC")
-    events = cursor.fetchall()
+    events = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return events
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_featured_events(limit=3):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM events ORDER BY id DESC LIMIT ?", (limit,))
+    events = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return events
 
+# Keyset pagination: the page of events with ids below before_id, newest first
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_events_page(before_id=None, limit=EVENTS_PAGE_SIZE):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if before_id is None:
+        cursor.execute("SELECT * FROM events ORDER BY id DESC LIMIT ?", (limit,))
+    else:
+        cursor.execute("SELECT * FROM events WHERE id < ? ORDER BY id DESC LIMIT ?", (before_id, limit))
+    events = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return events
+
+# Full-text search over events with the same keyset pagination; each word is matched as a prefix
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def search_events(query, before_id=None, limit=EVENTS_PAGE_SIZE):
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"*' for term in terms)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT e.*
+        FROM events_fts f
+        JOIN events e ON e.id = f.rowid
+        WHERE events_fts MATCH ? AND f.rowid < ?
+        ORDER BY f.rowid DESC
+        LIMIT ?
+    """, (match, before_id if before_id is not None else 2 ** 63 - 1, limit))
+    events = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return events
+
+# Drop every cached event listing after an event is added or removed
+def invalidate_event_caches():
+    get_all_events.clear()
+    get_featured_events.clear()
+    get_events_page.clear()
+    search_events.clear()
+    get_events_for_mood.clear()
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def get_user(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     user = cursor.fetchone()
     conn.close()
-    return user
+    return dict(user) if user else None
 
 def get_stall_crowd_density():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT s.stall_name, s.latitude, s.longitude, COUNT(ul.user_id) as crowd_count
-        FROM stalls s
-        LEFT JOIN user_locations ul ON (
-            (ul.latitude - s.latitude) * (ul.latitude - s.latitude) + 
-            (ul.longitude - s.longitude) * (ul.longitude - s.longitude)
-        ) <= (0.0005 * 0.0005)  -- Approx 50 meters in degrees
-        GROUP BY s.stall_name, s.latitude, s.longitude
-    """)
-    crowd_data = {row["stall_name"]: {"latitude": row["latitude"], "longitude": row["longitude"], "crowd_count": row["crowd_count"] or 0} for row in cursor.fetchall()}
+    cursor.execute("SELECT stall_name, latitude, longitude FROM stalls")
+    stalls = cursor.fetchall()
+    crowd_data = {}
+    for stall in stalls:
+        # Index lookup on the bounding box, then an exact distance filter
+        dlat, dlon = bounding_box(stall["latitude"], stall["longitude"], CROWD_RADIUS_METERS)
+        cursor.execute("""
+            SELECT ul.latitude, ul.longitude
+            FROM user_locations_rtree r
+            JOIN user_locations ul ON ul.user_id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+        """, (stall["latitude"] - dlat, stall["latitude"] + dlat, stall["longitude"] - dlon, stall["longitude"] + dlon))
+        crowd_count = sum(1 for user in cursor.fetchall()
+                          if geodesic((stall["latitude"], stall["longitude"]), (user["latitude"], user["longitude"])).meters <= CROWD_RADIUS_METERS)
+        crowd_data[stall["stall_name"]] = {"latitude": stall["latitude"], "longitude": stall["longitude"], "crowd_count": crowd_count}
     conn.close()
     return crowd_data
 
+# Names of stalls within radius_m of a point, using the stall R*Tree index
+def get_stalls_within(lat, lon, radius_m=CROWD_RADIUS_METERS):
+    dlat, dlon = bounding_box(lat, lon, radius_m)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT s.stall_name, s.latitude, s.longitude
+        FROM stalls_rtree r
+        JOIN stalls s ON s.user_id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+    """, (lat - dlat, lat + dlat, lon - dlon, lon + dlon))
+    stalls = {row["stall_name"] for row in cursor.fetchall()
+              if geodesic((lat, lon), (row["latitude"], row["longitude"])).meters <= radius_m}
+    conn.close()
+    return stalls
+
+# Fresh base map per render: st_folium adds the overlay to the Map it is given, so a Map must never be shared.
+# The settings are identical for the same (rounded) center, so the base HTML st_folium compares stays the same.
+def build_base_map(center_lat, center_lon):
+    return folium.Map(location=[center_lat, center_lon], zoom_start=13, prefer_canvas=True)
+
+# Crowd marker color by people count
+def crowd_color(crowd_count):
+    return "green" if crowd_count < 10 else "orange" if crowd_count < 20 else "red"
+
+# Stall crowd data as a GeoJSON FeatureCollection
+def crowd_to_geojson(crowd_data):
+    features = []
+    for stall_name, details in crowd_data.items():
+        if isinstance(details, dict) and "latitude" in details and "longitude" in details and "crowd_count" in details:
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [details["longitude"], details["latitude"]]},
+                "properties": {
+                    "stall_name": stall_name,
+                    "crowd_count": details["crowd_count"],
+                    "wait": f"{details['wait_minutes']} min" if details.get("wait_minutes") is not None else "n/a"
+                }
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+# Crowd overlay: one GeoJSON layer for all stalls plus the user's marker
+def build_crowd_overlay(crowd_data, user_location=None):
+    overlay = folium.FeatureGroup(name="Crowd Density")
+    geojson = crowd_to_geojson(crowd_data)
+    if geojson["features"]:
+        folium.GeoJson(
+            geojson,
+            marker=folium.CircleMarker(radius=9, fill=True, weight=1),
+            style_function=lambda feature: {
+                "color": crowd_color(feature["properties"]["crowd_count"]),
+                "fillColor": crowd_color(feature["properties"]["crowd_count"]),
+                "fillOpacity": 0.8
+            },
+            popup=folium.GeoJsonPopup(fields=["stall_name", "crowd_count", "wait"], aliases=["Stall", "Crowd Count", "Est. Wait"])
+        ).add_to(overlay)
+    if user_location:
+        folium.Marker(
+            list(user_location),
+            popup="Your Location",
+            icon=folium.Icon(color="green", icon="user")
+        ).add_to(overlay)
+    return overlay
+
 # Enhanced check_crowd_density with Folium map
 def check_crowd_density():
     if not st.session_state.user_id or st.session_state.user_id == "unknown":
@@ -236,33 +618,14 @@ def check_crowd_density():
         response = proxy_to_backend("/crowd_density", method="GET", json_data=params)
         crowd_data = response if "error" not in response else get_stall_crowd_density()
 
-        # Create a Folium map
+        # Same base map settings across checks; only the crowd overlay changes on the client
         user_lat = lat if st.session_state.get("last_location") else 37.7749  # Default to San Francisco if no user location
         user_lon = lon if st.session_state.get("last_location") else -122.4194
-        m = folium.Map(location=[user_lat, user_lon], zoom_start=13)
-
-        # Add user location marker
-        if st.session_state.get("last_location"):
-            folium.Marker(
-                [user_lat, user_lon],
-                popup="Your Location",
-                icon=folium.Icon(color="green", icon="user")
-            ).add_to(m)
-
-        # Add stall markers with crowd density
-        for stall_name, details in crowd_data.items():
-            if isinstance(details, dict) and "latitude" in details and "longitude" in details and "crowd_count" in details:
-                crowd_count = details["crowd_count"]
-                color = "green" if crowd_count < 10 else "orange" if crowd_count < 20 else "red"
-                popup_text = f"{stall_name}<br>Crowd Count: {crowd_count}"
-                folium.Marker(
-                    [details["latitude"], details["longitude"]],
-                    popup=popup_text,
-                    icon=folium.Icon(color=color, icon="info-sign")
-                ).add_to(m)
+        m = build_base_map(round(user_lat, 3), round(user_lon, 3))
+        overlay = build_crowd_overlay(crowd_data, (user_lat, user_lon) if st.session_state.get("last_location") else None)
 
         # Display the map
-        folium_static(m)
+        st_folium(m, feature_group_to_add=overlay, returned_objects=[], height=500, key="crowd_map")
 
         # Additional crowd density details
         if st.session_state.get("stall_registered", False) and st.session_state.get("stall_name"):
@@ -279,12 +642,9 @@ def check_crowd_density():
                 st.warning(f"No crowd data available for your stall ({stall_name}).")
         else:
             if st.session_state.get("last_location"):
-                nearby_stalls = {}
-                for stall_name, details in crowd_data.items():
-                    if isinstance(details, dict) and "latitude" in details and "longitude" in details:
-                        distance = geodesic((user_lat, user_lon), (details["latitude"], details["longitude"])).meters
-                        if distance <= 50:
-                            nearby_stalls[stall_name] = details
+                nearby_names = get_stalls_within(user_lat, user_lon)
+                nearby_stalls = {stall_name: details for stall_name, details in crowd_data.items()
+                                 if stall_name in nearby_names and isinstance(details, dict) and "crowd_count" in details}
                 if nearby_stalls:
                     st.success("Crowd Density for Nearby Stalls:")
                     chart_data = pd.DataFrame({
@@ -307,47 +667,150 @@ def check_crowd_density():
         st.error(f"Error fetching crowd density: {str(e)}")
 
 # Chatbot Functions
-def get_eventbuddy_response(user_input, user_id, conversation_history):
-    system_prompt = """
+CHAT_MODEL = "llama3-8b-8192"
+CHAT_PARAMS = {"max_tokens": 150, "temperature": 0.7}
+
+CHAT_SYSTEM_PROMPT = """
     You are EventBuddy, a cheerful and helpful AI assistant for EventHub, created by xAI. Your goal is to assist users with a friendly, witty vibe, just like Grok! Tasks include:
     1. Register users for events (use register_for_event).
     2. Create events (use add_event with title, date, venue, description, category).
-    3. Provide stall feedback (use load_feedback).
+    3. Provide stall feedback (use get_feedback_for_event).
     4. Recommend events or stalls based on interests (use get_interest_based_events or recommend_stalls).
     5. Check crowd density for stalls (use check_crowd_density or get_stall_crowd_density).
     Respond naturally, offer clarifications, and use [FETCH_DATA] for dynamic data.
     """
-    history = [{"role": "system", "content": system_prompt}]
-    for msg in conversation_history:
-        history.append({"role": msg["role"], "content": msg["message"]})
-    history.append({"role": "user", "content": user_input})
 
+# Bounded prompt: older turns are represented by the rolling summary, so prompt size stays flat
+def build_chat_messages(user_input, conversation_history, context=None):
+    if context is None:
+        context = chat_context.new_context()
+    return chat_context.build_messages(co, CHAT_SYSTEM_PROMPT, conversation_history, user_input, context)
+
+# Yield the reply as it is generated, logging time-to-first-token and total latency
+def stream_eventbuddy_response(user_input, user_id, conversation_history, context=None):
+    messages = build_chat_messages(user_input, conversation_history, context)
+    cache_key = llm_cache.make_key(CHAT_MODEL, messages, **CHAT_PARAMS)
+    start = time.perf_counter()
+    cached = llm_cache.get(cache_key, ttl=CHAT_CACHE_TTL)
+    if cached is not None:
+        logger.info(f"Chat response for user {user_id} served from cache in {time.perf_counter() - start:.3f}s")
+        yield cached
+        return
+
+    parts = []
+    first_token_at = None
     try:
-        response = co.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=history,
-            max_tokens=150,
-            temperature=0.7
-        )
-        assistant_response = response.choices[0].message.content.strip()
-        logger.info("Successfully fetched response from Groq API.")
+        stream = co.chat.completions.create(model=CHAT_MODEL, messages=messages, stream=True, **CHAT_PARAMS)
+        for chunk in stream:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if not token:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(token)
+            yield token
     except Exception as e:
         logger.error(f"Groq API error: {str(e)}")
-        return f"Oops! Couldn’t connect to the Groq API. Error: {str(e)}"
+        yield f"Oops! Couldn’t connect to the Groq API. Error: {str(e)}"
+        return
 
-    return assistant_response
+    total = time.perf_counter() - start
+    ttft = first_token_at - start if first_token_at is not None else total
+    logger.info(f"Chat response for user {user_id}: ttft={ttft:.3f}s total={total:.3f}s chars={sum(len(part) for part in parts)}")
+    response = "".join(parts).strip()
+    if response:
+        llm_cache.put(cache_key, response)
+
+# Event whose full title appears in a chat message. Titles sharing any word with the message come from
+# the events_fts index ranked by relevance, so only a handful of candidates are compared in Python.
+def find_event_in_text(text, limit=CHAT_TITLE_CANDIDATES):
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT e.id, e.title
+        FROM events_fts f
+        JOIN events e ON e.id = f.rowid
+        WHERE events_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ?
+    """, ("title : (" + " OR ".join(f'"{word}"' for word in words) + ")", limit))
+    candidates = {row["title"]: row["id"] for row in cursor.fetchall()}
+    conn.close()
+    title = chat_router.find_entity(text, list(candidates))
+    return {"id": candidates[title], "title": title} if title else None
+
+# Local answers for the intents chat_router recognizes; a handler returning None defers to the LLM
+# Registration is only proposed here; the chatbot page writes it after the user confirms
+def chat_register(text, user_id):
+    if not user_id:
+        return "Please log in with a User ID on the Home page first, then I can register you!"
+    event = find_event_in_text(text)
+    if not event:
+        latest = ", ".join(event["title"] for event in get_featured_events(3))
+        return f"Which event would you like to register for? Latest events: {latest or 'none yet'}."
+    title = event["title"]
+    st.session_state.pending_registration = event
+    return f"Would you like to register for {title}? Confirm below."
+
+def chat_create_event(text):
+    return "To create an event, open **Add Event** in the menu and fill in the title, date, venue and category. I can draft the description for you there!"
+
+def chat_crowd_density(text):
+    crowd_data = get_stall_crowd_density()
+    if not crowd_data:
+        return "I don't have any stall locations yet, so I can't check crowds right now."
+    stall = chat_router.find_entity(text, list(crowd_data))
+    if stall:
+        return f"{stall} has about {crowd_data[stall]['crowd_count']} people within {CROWD_RADIUS_METERS} m right now."
+    quietest = sorted(crowd_data.items(), key=lambda item: item[1]["crowd_count"])[:3]
+    return "Quietest stalls right now: " + ", ".join(f"{name} ({details['crowd_count']} people)" for name, details in quietest)
+
+def chat_recommendations(text, user_id):
+    if not user_id:
+        return "Please log in with a User ID on the Home page first so I know your interests!"
+    events = get_interest_based_events(user_id, limit=3)
+    if not events:
+        return "I couldn't find events matching your interests yet. Check the Recommendations page for mood and trend picks!"
+    return "Based on your interests, try: " + ", ".join(f"{event['title']} ({event['category']})" for event in events)
+
+def chat_feedback(text):
+    feedback_events = get_feedback_events()
+    if not feedback_events:
+        return "No feedback has been submitted yet."
+    target = chat_router.find_entity(text, feedback_events)
+    if not target:
+        return "Which one? I have feedback for: " + ", ".join(feedback_events[:10])
+    aggregate = get_feedback_aggregate(target)
+    recent = get_feedback_for_event(target)["feedback"].dropna().astype(str).tail(3).tolist()
+    reply = f"{target} has {aggregate['count']} reviews with an average rating of {aggregate['mean_rating']:.1f}/5."
+    if recent:
+        reply += " Recent comments: " + " | ".join(recent)
+    return reply
+
+def route_chat_request(user_input, user_id):
+    return chat_router.route(user_input, {
+        "register": lambda text: chat_register(text, user_id),
+        "create_event": chat_create_event,
+        "crowd_density": chat_crowd_density,
+        "recommendations": lambda text: chat_recommendations(text, user_id),
+        "feedback": chat_feedback
+    })
 
 # Other Utility Functions
 def add_user(name, email, interests):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO users (name, email, interests) VALUES (?, ?, ?)",
-                   (name, email, ",".join(interests)))
+    interests_mask = encode_interests(interests)
+    cursor.execute("INSERT INTO users (name, email, interests, interests_mask) VALUES (?, ?, ?, ?)",
+                   (name, email, ",".join(interests), interests_mask))
     conn.commit()
     user_id = cursor.lastrowid
     conn.close()
     
-    user_data = pd.DataFrame([{"id": user_id, "name": name, "email": email, "interests": ",".join(interests)}])
+    user_data = pd.DataFrame([{"id": user_id, "name": name, "email": email, "interests": ",".join(interests), "interests_mask": interests_mask}])
     if os.path.exists("user_interests.csv"):
         existing_data = pd.read_csv("user_interests.csv")
         updated_data = pd.concat([existing_data, user_data], ignore_index=True)
@@ -355,7 +818,7 @@ def add_user(name, email, interests):
         updated_data = user_data
     updated_data.to_csv("user_interests.csv", index=False)
     
-    user_id_interests = pd.DataFrame([{"id": user_id, "interests": ",".join(interests)}])
+    user_id_interests = pd.DataFrame([{"id": user_id, "interests": ",".join(interests), "interests_mask": interests_mask}])
     if os.path.exists("user_id_interests.csv"):
         existing_id_data = pd.read_csv("user_id_interests.csv")
         updated_id_data = pd.concat([existing_id_data, user_id_interests], ignore_index=True)
@@ -363,14 +826,15 @@ def add_user(name, email, interests):
         updated_id_data = user_id_interests
     updated_id_data.to_csv("user_id_interests.csv", index=False)
     
+    get_user.clear()
     logger.info(f"User interests for {name} (ID: {user_id}) saved to SQLite and CSV files.")
     return user_id
 
 def add_event(title, date, venue, description, category, created_by):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO events (title, date, venue, description, category, created_by) VALUES (?, ?, ?, ?, ?, ?)",
-                   (title, date, venue, description, category, created_by))
+    cursor.execute("INSERT INTO events (title, date, venue, description, category, category_mask, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   (title, date, venue, description, category, encode_interests([category]), created_by))
     conn.commit()
     event_id = cursor.lastrowid
     conn.close()
@@ -383,48 +847,78 @@ def add_event(title, date, venue, description, category, created_by):
             writer.writerow(["event_id", "title", "date", "venue", "description", "category", "created_by"])
         writer.writerow([event_id, title, date, venue, description, category, created_by])
     
+    invalidate_event_caches()
     logger.info(f"Event '{title}' (ID: {event_id}) added by user {created_by} to database and CSV file")
     return event_id
 
-def get_interest_based_events(user_id):
+# Events in any of the user's categories, earliest first; the mask is expanded to category names
+# so the lookup can use idx_events_category_date instead of scanning every event
+def get_interest_based_events(user_id, limit=EVENTS_PAGE_SIZE):
     user = get_user(user_id)
-    if not user or not user['interests']:
+    if not user:
+        return []
+    interests_mask = user.get('interests_mask') or encode_interests(user['interests'])
+    categories = decode_mask(interests_mask)
+    if not categories:
         return []
-    interests = user['interests'].split(',')
     conn = get_db_connection()
     cursor = conn.cursor()
-    query = "SELECT * FROM events WHERE category IN ({})".format(','.join('?' * len(interests)))
-    cursor.execute(query, interests)
+    placeholders = ", ".join("?" for _ in categories)
+    cursor.execute(f"SELECT * FROM events WHERE category IN ({placeholders}) ORDER BY date LIMIT ?", (*categories, limit))
     recommended = cursor.fetchall()
     conn.close()
     return recommended
 
+# Events co-registered by people with similar registrations ("people who registered for X also registered for Y")
+def get_collaborative_events(user_id, limit=5):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    events = event_similarity.recommend_for_user(cursor, user_id, limit)
+    conn.close()
+    return events
+
 def register_for_event(user_id, event_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM registrations WHERE user_id = ? AND event_id = ?", (user_id, event_id))
-    if cursor.fetchone():
-        conn.close()
-        return False
-    cursor.execute("INSERT INTO registrations (user_id, event_id, registration_date) VALUES (?, ?, CURRENT_TIMESTAMP)", (user_id, event_id))
+    # The unique (user_id, event_id) index turns a duplicate registration into a no-op
+    registered_at = datetime.utcnow().replace(microsecond=0)
+    cursor.execute("INSERT OR IGNORE INTO registrations (user_id, event_id, registration_date) VALUES (?, ?, ?)",
+                   (user_id, event_id, registered_at.strftime(trend_scores.TIMESTAMP_FORMAT)))
+    registered = cursor.rowcount == 1
+    if registered:
+        cursor.execute("SELECT category FROM events WHERE id = ?", (event_id,))
+        event = cursor.fetchone()
+        if event and event["category"]:
+            trend_scores.apply_registration(cursor, user_id, event["category"], registered_at)
+        # Precomputed picks are stale now; serve live trend picks until the next batch run
+        cursor.execute("DELETE FROM trend_recommendations WHERE user_id = ?", (user_id,))
+        event_similarity.record_registration(cursor, user_id, event_id)
     conn.commit()
     conn.close()
-    return True
+    if registered:
+        get_user_registrations.clear()
+    return registered
 
-def suggest_best_stall(user_id):
+def suggest_best_stall(user_id, rank_by="crowd"):
     try:
-        response = requests.post(f"{BACKEND_URL}/suggest_stall", json={"user_id": user_id}, timeout=10)
+        response = get_http_session().post(f"{BACKEND_URL}/suggest_stall", json={"user_id": user_id, "rank_by": rank_by}, timeout=10)
         if response.status_code == 200:
             suggestion = response.json()
             if "error" in suggestion:
                 st.warning(suggestion["error"])
             else:
+                wait_text = f"{suggestion['wait_minutes']} min" if suggestion.get("wait_minutes") is not None else "Not enough data yet"
                 st.markdown(f"""
                     <div class="suggestion-message">
                         Recommended Stall: {suggestion['stall']}<br>
-                        Reason: {suggestion['reason']}
+                        Reason: {suggestion['reason']}<br>
+                        Estimated Wait: {wait_text}
                     </div>
                 """, unsafe_allow_html=True)
+                if suggestion.get("ranking"):
+                    ranking = pd.DataFrame(suggestion["ranking"])
+                    st.dataframe(ranking[["stall", "score", "crowd_count", "crowd_score", "interest_score", "distance_meters", "distance_score", "wait_minutes"]],
+                                 hide_index=True)
         else:
             st.error(f"Error fetching stall suggestion. Status: {response.status_code}, Response: {response.text}")
     except requests.RequestException as e:
@@ -448,6 +942,8 @@ def main():
         st.session_state.user_id = None
     if 'conversation_history' not in st.session_state:
         st.session_state.conversation_history = []
+    if 'chat_context' not in st.session_state:
+        st.session_state.chat_context = chat_context.new_context()
     if 'stall_registered' not in st.session_state:
         st.session_state.stall_registered = False
     if 'stall_name' not in st.session_state:
@@ -571,10 +1067,10 @@ def main():
                 st.session_state.page = "Register"
                 st.rerun()
             st.markdown("<h3>Featured Events</h3>", unsafe_allow_html=True)
-            events = get_all_events()
+            events = get_featured_events()
             if events:
                 st.write("Explore our top picks!")
-                for event in events[:3]:
+                for event in events:
                     display_event(event, show_register=True, user_id=st.session_state.user_id, creator_id=event['created_by'], page="Home")
             else:
                 st.write("No events available yet.")
@@ -600,12 +1096,29 @@ def main():
         elif st.session_state.page == "All Events":
             st.markdown("<h2 class='section-title'>Upcoming Events</h2>", unsafe_allow_html=True)
             st.write("Browse all events happening soon.")
-            events = get_all_events()
+            search_query = st.text_input("Search events", placeholder="Search by title, description, venue or category", key="event_search").strip()
+            # Stack of keyset cursors, one per page visited; reset whenever the search changes
+            if st.session_state.get("events_query") != search_query:
+                st.session_state.events_query = search_query
+                st.session_state.events_cursors = [None]
+            before_id = st.session_state.events_cursors[-1]
+            events = search_events(search_query, before_id) if search_query else get_events_page(before_id)
             if events:
                 for event in events:
                     display_event(event, show_register=True, show_delete=True, user_id=st.session_state.user_id, creator_id=event['created_by'], page="All_Events")
+            elif search_query:
+                st.write(f"No events match '{search_query}'.")
             else:
                 st.write("No events available yet.")
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if len(st.session_state.events_cursors) > 1 and st.button("Previous Page", key="events_prev_page"):
+                    st.session_state.events_cursors.pop()
+                    st.rerun()
+            with col_next:
+                if len(events) == EVENTS_PAGE_SIZE and st.button("Next Page", key="events_next_page"):
+                    st.session_state.events_cursors.append(events[-1]["id"])
+                    st.rerun()
 
         elif st.session_state.page == "My Events":
             st.markdown("<h2 class='section-title'>My Events</h2>", unsafe_allow_html=True)
@@ -624,7 +1137,7 @@ def main():
             if not st.session_state.user_id:
                 st.warning("Please log in first.")
             else:
-                tab1, tab2, tab3 = st.tabs(["Interest-Based Picks", "Mood-Based Suggestions", "Trend-Based Picks"])
+                tab1, tab2, tab3, tab4 = st.tabs(["Interest-Based Picks", "Mood-Based Suggestions", "Trend-Based Picks", "People Also Registered"])
                 with tab1:
                     st.subheader("Based on Your Interests")
                     interest_events = get_interest_based_events(st.session_state.user_id)
@@ -653,6 +1166,14 @@ def main():
                             display_event(event, show_register=True, user_id=st.session_state.user_id, creator_id=event['created_by'], page="Recommendations_Trend")
                     else:
                         st.write("No trend-based recommendations yet. Register for more events to see suggestions!")
+                with tab4:
+                    st.subheader("People Who Registered for Your Events Also Registered For")
+                    collaborative_events = get_collaborative_events(st.session_state.user_id)
+                    if collaborative_events:
+                        for event in collaborative_events:
+                            display_event(event, show_register=True, user_id=st.session_state.user_id, creator_id=event['created_by'], page="Recommendations_Collaborative")
+                    else:
+                        st.write("No co-registration picks yet. Register for a few events to see what others also joined!")
 
         elif st.session_state.page == "Add Event":
             st.markdown("<h2 class='section-title'>Create an Event</h2>", unsafe_allow_html=True)
@@ -688,30 +1209,38 @@ def main():
             event = st.selectbox("Event or Stall", events)
             rating = st.slider("Rating", 1, 5, 3, help="Rate from 1 (poor) to 5 (excellent)")
             if st.button("Submit Feedback"):
-                df = load_feedback()
-                df = pd.concat([df, pd.DataFrame([{"name": name, "feedback": feedback, "event": str(event), "rating": rating, "response": ""}])], ignore_index=True)
-                save_feedback(df)
+                add_feedback(name, feedback, str(event), rating)
                 st.success("Feedback submitted successfully!")
                 logger.info(f"Feedback submitted for {event} by {name}")
 
         elif st.session_state.page == "Performance Insights":
             st.markdown("<h2 class='section-title'>Event Insights</h2>", unsafe_allow_html=True)
-            df = load_feedback()
-            if df.empty:
+            feedback_events = get_feedback_events()
+            if not feedback_events:
                 st.write("No feedback available.")
                 return
-            stall_selected = st.selectbox("Select event or stall to Analyze", df["event"].dropna().unique())
-            stall_feedback = df[df["event"] == stall_selected]
-            feedback_text = " ".join(stall_feedback["feedback"].dropna().tolist())
+            stall_selected = st.selectbox("Select event or stall to Analyze", feedback_events)
+            aggregate = get_feedback_aggregate(stall_selected)
+            if aggregate:
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Feedback", aggregate["count"])
+                col2.metric("Average Rating", f"{aggregate['mean_rating']:.2f}")
+                col3.metric("Average Sentiment", f"{aggregate['mean_sentiment']:+.2f}")
+            stall_feedback = get_feedback_for_event(stall_selected)
             try:
-                response = co.chat.completions.create(
+                # Map-reduce keeps each prompt within the context window; only new chunks are re-summarized
+                feedback_text = feedback_summary.summarize_feedback(co, stall_selected, stall_feedback["feedback"].dropna().astype(str).tolist())
+                prediction = llm_cache.cached_completion(
+                    co,
                     model="llama3-8b-8192",
                     messages=[
                         {"role": "system", "content": "You are an analyst summarizing event performance based on feedback."},
                         {"role": "user", "content": f"Analyze feedback for {stall_selected} and summarize event performance: {feedback_text}"}
-                    ]
+                    ],
+                    ttl=LLM_CACHE_TTL,
+                    namespace=f"insights:{stall_selected}",
+                    version=aggregate["version"] if aggregate else 0
                 )
-                prediction = response.choices[0].message.content
                 logger.info(f"Generated performance prediction for {stall_selected}")
             except Exception as e:
                 prediction = f"Error fetching prediction: {str(e)}"
@@ -721,24 +1250,28 @@ def main():
 
         elif st.session_state.page == "Stall Suggestions":
             st.markdown("<h2 class='section-title'>Event Recommendations</h2>", unsafe_allow_html=True)
-            df = load_feedback()
-            if df.empty:
+            feedback_events = get_feedback_events()
+            if not feedback_events:
                 st.write("No feedback available to generate recommendations.")
                 return
-            user_interest = st.selectbox("Select an event or stall you are interested in", df["event"].dropna().unique())
-            feedback_text = " ".join(df[df["event"] == user_interest]["feedback"].dropna().tolist())
-            if not feedback_text:
+            user_interest = st.selectbox("Select an event or stall you are interested in", feedback_events)
+            feedback_texts = get_feedback_for_event(user_interest)["feedback"].dropna().astype(str).tolist()
+            if not any(text.strip() for text in feedback_texts):
                 st.write(f"No feedback available for {user_interest} to generate recommendations.")
                 return
             try:
-                response = co.chat.completions.create(
+                feedback_text = feedback_summary.summarize_feedback(co, user_interest, feedback_texts)
+                recommendation = llm_cache.cached_completion(
+                    co,
                     model="llama3-8b-8192",
                     messages=[
                         {"role": "system", "content": "You are a recommendation system suggesting stalls based on event feedback."},
                         {"role": "user", "content": f"Based on past feedback and event performance, suggest the best stalls for a user interested in {user_interest}. Feedback data: {feedback_text}"}
-                    ]
+                    ],
+                    ttl=LLM_CACHE_TTL,
+                    namespace=f"stall_suggestions:{user_interest}",
+                    version=get_feedback_version(user_interest)
                 )
-                recommendation = response.choices[0].message.content
                 logger.info(f"Generated stall recommendation for interest: {user_interest}")
             except Exception as e:
                 recommendation = f"Error fetching recommendation: {str(e)}"
@@ -755,116 +1288,52 @@ def main():
                     if not st.session_state.user_id or st.session_state.user_id == "unknown":
                         st.error("Error: User ID is required.")
                     else:
-                        st.session_state["geo_data"] = None
-                        location_script = """
-                        <script>
-                        let retryCount = 0;
-                        const MAX_RETRIES = 3;
-                        const TIMEOUT = 10000;
-                        const ACCURACY_THRESHOLD = 1000;
-
-                        function checkPermissionsAndGetLocation() {
-                            console.log("Initiating geolocation request...");
-                            navigator.permissions.query({ name: "geolocation" }).then((result) => {
-                                if (result.state === "denied") {
-                                    console.error("Location permission denied. Please enable in browser settings and ensure Wi-Fi is on.");
-                                    window.parent.postMessage({ type: "geolocation", data: "Error: Location permission denied. Please enable in browser settings and ensure Wi-Fi is on." }, "*");
-                                    return;
-                                }
-                                console.log("Location permission state: " + result.state);
-                                getLocation();
-                            }).catch((error) => {
-                                console.error("Permission check error: " + error);
-                                window.parent.postMessage({ type: "geolocation", data: "Error: Unable to check permissions - " + error }, "*");
-                            });
-                        }
-
-                        function getLocation() {
-                            if (!navigator.geolocation) {
-                                console.error("Geolocation not supported by browser");
-                                window.parent.postMessage({ type: "geolocation", data: "Error: Geolocation not supported by browser" }, "*");
-                                return;
-                            }
-                            console.log("Attempting to fetch location via Wi-Fi triangulation (Retry " + (retryCount + 1) + "/5)...");
-                            navigator.geolocation.getCurrentPosition(
-                                (position) => {
-                                    const lat = position.coords.latitude;
-                                    const lon = position.coords.longitude;
-                                    const accuracy = position.coords.accuracy || 0;
-                                    const source = accuracy <= ACCURACY_THRESHOLD ? "Wi-Fi Triangulation" : "IP Triangulation";
-                                    console.log(`Geolocation attempt ${retryCount + 1}: lat=${lat}, lon=${lon}, accuracy=${accuracy}m, source=${source}`);
-                                    if (accuracy > ACCURACY_THRESHOLD && retryCount < MAX_RETRIES) {
-                                        retryCount++;
-                                        console.log(`Accuracy too low (${accuracy}m). Retrying (${retryCount}/${MAX_RETRIES})...`);
-                                        setTimeout(getLocation, 3000);
-                                    } else {
-                                        if (accuracy > ACCURACY_THRESHOLD) {
-                                            console.log("Max retries reached with low accuracy. Will fall back to IP-based location.");
-                                        } else {
-                                            console.log("Geolocation successful after " + (retryCount + 1) + " attempt(s).");
-                                        }
-                                        window.parent.postMessage({ type: "geolocation", data: { lat: lat, lon: lon, accuracy: accuracy, source: source } }, "*");
-                                    }
-                                },
-                                (error) => {
-                                    console.error(`Geolocation Error (Retry ${retryCount + 1}/5): Code ${error.code} - ${error.message}`);
-                                    if ((error.code === 3 || error.code === 2) && retryCount < MAX_RETRIES) {
-                                        retryCount++;
-                                        console.log(`Retrying due to error (${retryCount}/${MAX_RETRIES})...`);
-                                        setTimeout(getLocation, 3000);
-                                    } else {
-                                        console.log(`Failed to get Wi-Fi triangulation after ${MAX_RETRIES} retries. Will fall back to IP-based location. Error: ${error.message}`);
-                                        window.parent.postMessage({ type: "geolocation", data: `Error: Failed to get location after ${MAX_RETRIES} retries (Code: ${error.code})` }, "*");
-                                    }
-                                },
-                                { enableHighAccuracy: true, timeout: TIMEOUT, maximumAge: 0 }
-                            );
-                        }
-                        checkPermissionsAndGetLocation();
-                        </script>
-                        <script>
-                        window.addEventListener("message", function(event) {
-                            if (event.data && event.data.type === "geolocation") {
-                                window.parent.postMessage(event.data, "*");
-                            }
-                        });
-                        </script>
-                        """
-                        st.components.v1.html(location_script, height=0)
-                        time.sleep(25)
-                        if "geo_data" not in st.session_state or st.session_state["geo_data"] is None:
-                            st.text("Wi-Fi triangulation failed after retries. Falling back to IP-based location...")
+                        # A fresh key mounts a new component instance, which asks the browser for a new fix
+                        st.session_state.geo_request = st.session_state.get("geo_request", 0) + 1
+                        st.session_state.geo_pending = True
+
+                if st.session_state.get("geo_pending"):
+                    # Returns None until the browser reports back, which triggers a rerun with the fix
+                    geo_data = geolocation_component(
+                        timeout_ms=GEOLOCATION_TIMEOUT_MS,
+                        accuracy_threshold=GEOLOCATION_ACCURACY_THRESHOLD,
+                        key=f"geolocation_{st.session_state.geo_request}",
+                        default=None
+                    )
+                    if geo_data is None:
+                        st.info("Waiting for your browser's location...")
+                    else:
+                        st.session_state.geo_pending = False
+                        if geo_data.get("error"):
+                            logger.info(f"Browser geolocation failed: {geo_data['error']}")
+                            st.text("Wi-Fi triangulation failed. Falling back to IP-based location...")
                             lat, lon = get_fallback_location()
                             if lat is not None and lon is not None:
-                                st.session_state["geo_data"] = {"lat": lat, "lon": lon, "accuracy": 2000, "source": "IP-based"}
+                                geo_data = {"lat": lat, "lon": lon, "accuracy": 2000, "source": "IP-based"}
                             else:
+                                geo_data = None
                                 st.error("Failed to get any location data. Please use manual input.")
-                        if "geo_data" in st.session_state and st.session_state["geo_data"]:
-                            geo_data = st.session_state["geo_data"]
-                            if isinstance(geo_data, str) and geo_data.startswith("Error:"):
-                                st.error(geo_data)
-                            elif isinstance(geo_data, dict):
-                                lat = float(geo_data.get("lat", 0))
-                                lon = float(geo_data.get("lon", 0))
-                                if -90 <= lat <= 90 and -180 <= lon <= 180:
-                                    success = share_location(
-                                        st.session_state.user_id,
-                                        lat,
-                                        lon,
-                                        st.session_state.is_stall_owner and not st.session_state.stall_registered,
-                                        st.session_state.stall_name if st.session_state.is_stall_owner else None
-                                    )
-                                    if success:
-                                        st.session_state.last_location = f"({lat}, {lon})"
-                                        st.success("Location updated")
-                                        if st.session_state.is_stall_owner and not st.session_state.stall_registered:
-                                            st.session_state.stall_registered = True
-                                            st.rerun()
-                                    else:
-                                        st.error("Failed to save location to backend.")
+                        if geo_data:
+                            lat = float(geo_data.get("lat", 0))
+                            lon = float(geo_data.get("lon", 0))
+                            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                                success = share_location(
+                                    st.session_state.user_id,
+                                    lat,
+                                    lon,
+                                    st.session_state.is_stall_owner and not st.session_state.stall_registered,
+                                    st.session_state.stall_name if st.session_state.is_stall_owner else None
+                                )
+                                if success:
+                                    st.session_state.last_location = f"({lat}, {lon})"
+                                    st.success("Location updated")
+                                    if st.session_state.is_stall_owner and not st.session_state.stall_registered:
+                                        st.session_state.stall_registered = True
+                                        st.rerun()
                                 else:
-                                    st.error("Invalid latitude or longitude values.")
-                            del st.session_state["geo_data"]
+                                    st.error("Failed to save location to backend.")
+                            else:
+                                st.error("Invalid latitude or longitude values.")
 
             if st.session_state.user_id and not st.session_state.stall_registered:
                 st.session_state.is_stall_owner = st.checkbox("I’m a Stall Owner", key="stall_owner_checkbox")
@@ -905,8 +1374,9 @@ def main():
             if st.button("Check Crowd Density", key="crowd_density_button"):
                 check_crowd_density()
 
+            rank_by_forecast = st.checkbox("Rank by 15-minute crowd forecast", key="rank_by_forecast_checkbox")
             if st.session_state.user_id and st.button("Suggest Best Stall", key="suggest_stall_button"):
-                suggest_best_stall(st.session_state.user_id)
+                suggest_best_stall(st.session_state.user_id, rank_by="forecast" if rank_by_forecast else "crowd")
 
             st.markdown("""
                 <p style="color: orange; font-size: 14px;">
@@ -920,46 +1390,49 @@ def main():
             if password != "admin123":
                 st.warning("Incorrect password!")
                 return
-            df = load_feedback()
-            if df.empty:
+            feedback_events = get_feedback_events()
+            if not feedback_events:
                 st.write("No feedback to display.")
                 return
             st.subheader("Feedback Overview")
-            selected_stall = st.selectbox("Select event or stall", df["event"].dropna().unique())
-            stall_feedback = df[df["event"] == selected_stall]
+            selected_stall = st.selectbox("Select event or stall", feedback_events)
+            stall_feedback = get_feedback_for_event(selected_stall)
             st.write(stall_feedback)
             reply_option = st.radio("Do you want to reply to feedback?", ["No", "Yes"])
             if reply_option == "Yes":
-                feedback_options = stall_feedback[stall_feedback["response"].isna() | (stall_feedback["response"] == "")]
+                feedback_options = get_feedback_for_event(selected_stall, unanswered_only=True)
                 if feedback_options.empty:
                     st.write("No feedback available to reply.")
                     return
                 selected_feedback = st.selectbox("Select feedback to reply", feedback_options.index)
-                row = df.loc[selected_feedback]
+                row = feedback_options.loc[selected_feedback]
                 st.subheader(f"Feedback from {row['name']} ({row['event']})")
                 st.write(row["feedback"])
                 response = st.text_area("Your Response")
                 if st.button("Submit Response"):
-                    df.at[selected_feedback, "response"] = response
-                    save_feedback(df)
+                    respond_to_feedback(int(selected_feedback), response)
                     st.success("Response submitted!")
                     st.rerun()
             st.subheader("Delete Feedback")
             delete_option = st.radio("Do you want to delete a feedback?", ["No", "Yes"])
             if delete_option == "Yes":
-                delete_feedback = st.selectbox("Select feedback to delete", stall_feedback.index)
+                feedback_to_delete = st.selectbox("Select feedback to delete", stall_feedback.index)
                 if st.button("Delete Feedback"):
-                    df = df.drop(index=delete_feedback)
-                    save_feedback(df)
+                    delete_feedback(int(feedback_to_delete))
                     st.success("Feedback deleted successfully!")
                     st.rerun()
             st.subheader("Analytics")
-            st.write(f"Total feedback received for {selected_stall}: {len(stall_feedback)}")
-            rating_counts = stall_feedback["rating"].value_counts().sort_index()
-            fig, ax = plt.subplots()
-            ax.pie(rating_counts, labels=rating_counts.index, autopct='%1.1f%%', startangle=90, colors=["#ff9999","#66b3ff","#99ff99","#ffcc99","#c2c2f0"])
-            ax.axis('equal')
-            st.pyplot(fig)
+            aggregate = get_feedback_aggregate(selected_stall)
+            if not aggregate:
+                st.write(f"No feedback left for {selected_stall}.")
+            else:
+                st.write(f"Total feedback received for {selected_stall}: {aggregate['count']}")
+                st.write(f"Average rating: {aggregate['mean_rating']:.2f} | Average sentiment: {aggregate['mean_sentiment']:+.2f} | Replied: {aggregate['responses']}")
+                rating_counts = {rating: count for rating, count in aggregate["histogram"].items() if count}
+                fig, ax = plt.subplots()
+                ax.pie(list(rating_counts.values()), labels=list(rating_counts.keys()), autopct='%1.1f%%', startangle=90, colors=["#ff9999","#66b3ff","#99ff99","#ffcc99","#c2c2f0"])
+                ax.axis('equal')
+                st.pyplot(fig)
             
             if st.button("Export User IDs and Interests to CSV"):
                 extract_user_id_interests_to_csv()
@@ -978,20 +1451,19 @@ def main():
                 "Get Stall Feedback"
             ]
             selected_query = st.selectbox("Quick Options", [""] + query_options, key="chat_query")
+            pending_inputs = []
             if selected_query and st.button("Go", key="go_button"):
-                user_input = selected_query
-                if "Register" in selected_query and st.session_state.user_id:
-                    user_input += ", " + next((e["title"] for e in get_all_events()), "Tech Fest")
-                response = get_eventbuddy_response(user_input, st.session_state.user_id, st.session_state.conversation_history)
-                st.session_state.conversation_history.append({"role": "user", "message": user_input})
-                st.session_state.conversation_history.append({"role": "assistant", "message": response})
+                if st.session_state.user_id:
+                    pending_inputs.append(selected_query)
+                else:
+                    st.warning("Oops! Please log in with a User ID on the Home page first!")
 
             st.markdown('</div>', unsafe_allow_html=True)
             user_input = st.text_input("You:", key="chat_input", placeholder="Type your question here...")
-            if user_input and st.session_state.user_id:
-                response = get_eventbuddy_response(user_input, st.session_state.user_id, st.session_state.conversation_history)
-                st.session_state.conversation_history.append({"role": "user", "message": user_input})
-                st.session_state.conversation_history.append({"role": "assistant", "message": response})
+            # The text box keeps its value across reruns, so only a changed message is sent
+            if user_input and st.session_state.user_id and user_input != st.session_state.get("last_chat_input"):
+                st.session_state.last_chat_input = user_input
+                pending_inputs.append(user_input)
             elif user_input and not st.session_state.user_id:
                 st.warning("Oops! Please log in with a User ID on the Home page first!")
 
@@ -999,8 +1471,39 @@ def main():
             for msg in st.session_state.conversation_history:
                 message_class = "user-message" if msg["role"] == "user" else "bot-message"
                 st.markdown(f'<div class="message-bubble {message_class}">{msg["message"]}</div>', unsafe_allow_html=True)
+            # Recognized intents are answered locally; other replies are streamed token by token.
+            # Both then join the history as regular bubbles.
+            for user_input in pending_inputs:
+                st.markdown(f'<div class="message-bubble user-message">{user_input}</div>', unsafe_allow_html=True)
+                response = route_chat_request(user_input, st.session_state.user_id)
+                if response is not None:
+                    st.markdown(f'<div class="message-bubble bot-message">{response}</div>', unsafe_allow_html=True)
+                else:
+                    response = st.write_stream(stream_eventbuddy_response(user_input, st.session_state.user_id, st.session_state.conversation_history,
+                                                                          st.session_state.chat_context))
+                st.session_state.conversation_history.append({"role": "user", "message": user_input})
+                st.session_state.conversation_history.append({"role": "assistant", "message": response.strip() if isinstance(response, str) else "".join(response)})
+                chat_context.schedule_summary(co, st.session_state.chat_context, st.session_state.conversation_history)
             st.markdown('</div>', unsafe_allow_html=True)
 
+            pending_registration = st.session_state.get("pending_registration")
+            if pending_registration and st.session_state.user_id:
+                col1, col2 = st.columns(2)
+                if col1.button(f"Confirm registration for {pending_registration['title']}", key="confirm_chat_registration"):
+                    if register_for_event(st.session_state.user_id, pending_registration["id"]):
+                        reply = f"Done! You're registered for {pending_registration['title']} 🎉"
+                    else:
+                        reply = f"You're already registered for {pending_registration['title']}."
+                    st.session_state.conversation_history.append({"role": "assistant", "message": reply})
+                    st.session_state.pending_registration = None
+                    st.rerun()
+                if col2.button("Cancel", key="cancel_chat_registration"):
+                    st.session_state.pending_registration = None
+                    st.rerun()
+            routed = sum(chat_router.router_stats["routed"].values())
+            if routed or chat_router.router_stats["fallback"]:
+                st.caption(f"Answered locally: {routed} | Sent to LLM: {chat_router.router_stats['fallback']} | Local hit rate: {chat_router.hit_rate():.0%}")
+
 def display_event(event, show_register=False, show_delete=False, user_id=None, creator_id=None, page=None):
     with st.container():
         st.markdown(f"""
@@ -1038,101 +1541,75 @@ def delete_event(event_id, user_id):
     if not event or event['created_by'] != user_id:
         conn.close()
         return False
+    cursor.execute("""
+        SELECT r.user_id, r.registration_date, e.category
+        FROM registrations r
+        JOIN events e ON r.event_id = e.id
+        WHERE r.event_id = ?
+    """, (event_id,))
+    now = datetime.utcnow()
+    for registration in cursor.fetchall():
+        registered_at = trend_scores.registration_time(registration["registration_date"], now)
+        trend_scores.remove_registration(cursor, registration["user_id"], registration["category"], registered_at)
+    event_similarity.remove_event(cursor, event_id)
     cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
     cursor.execute("DELETE FROM registrations WHERE event_id = ?", (event_id,))
     conn.commit()
     conn.close()
+    invalidate_event_caches()
+    get_user_registrations.clear()
     logger.info(f"Event {event_id} deleted by user {user_id}")
     return True
 
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
 def get_user_registrations(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT e.* FROM events e JOIN registrations r ON e.id = r.event_id WHERE r.user_id = ?", (user_id,))
-    registrations = cursor.fetchall()
+    registrations = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return registrations
 
-def get_mood_based_events(mood_input):
-    if not mood_input:
-        return []
-    blob = TextBlob(mood_input)
-    sentiment = blob.sentiment.polarity
-    mood = "positive" if sentiment > 0.3 else "negative" if sentiment < -0.3 else "neutral"
+# Events for one mood bucket; only three buckets exist, so each query is cached once
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_events_for_mood(mood):
     mood_categories = MOOD_MAPPING[mood]
     conn = get_db_connection()
     cursor = conn.cursor()
     query = "SELECT * FROM events WHERE category IN ({})".format(','.join('?' * len(mood_categories)))
     cursor.execute(query, mood_categories)
-    mood_events = cursor.fetchall()
+    mood_events = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return mood_events
 
-def calculate_trend_scores(user_id, decay_rate=0.02):
+def get_mood_based_events(mood_input):
+    if not mood_input:
+        return []
+    return get_events_for_mood(sentiment_service.mood_bucket(mood_input))
+
+# Decayed category scores, read from the materialized user_category_scores table
+def calculate_trend_scores(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT e.category, r.registration_date, r.id 
-        FROM registrations r 
-        JOIN events e ON r.event_id = e.id 
-        WHERE r.user_id = ?
-    """, (user_id,))
-    bookings = cursor.fetchall()
+    scores = trend_scores.get_category_scores(cursor, user_id)
     conn.close()
-    
-    if not bookings:
-        return {}
-    
-    category_scores = {}
-    current_date = datetime.now()
-    
-    booking_ids = [booking['id'] for booking in bookings if 'id' in booking and booking['id'] is not None]
-    if not booking_ids:
-        return {}
-    
-    min_id = min(booking_ids)
-    max_id = max(booking_ids)
-    id_range = max_id - min_id if max_id > min_id else 1
-    
-    for booking in bookings:
-        try:
-            category = booking['category'] if 'category' in booking else None
-            if not category:
-                continue
-            
-            reg_date_str = booking["registration_date"]
-            if reg_date_str:
-                try:
-                    reg_date = datetime.strptime(reg_date_str, "%Y-%m-%d %H:%M:%S")
-                except (ValueError, TypeError):
-                    if 'id' in booking and booking['id'] is not None:
-                        if id_range > 0:
-                            days_ago = int((max_id - booking['id']) * 90 / id_range)
-                            reg_date = current_date - timedelta(days=days_ago)
-                        else:
-                            reg_date = current_date - timedelta(days=30)
-                    else:
-                        reg_date = current_date - timedelta(days=30)
-            else:
-                if 'id' in booking and booking['id'] is not None:
-                    if id_range > 0:
-                        days_ago = int((max_id - booking['id']) * 90 / id_range)
-                        reg_date = current_date - timedelta(days=days_ago)
-                    else:
-                        reg_date = current_date - timedelta(days=30)
-                else:
-                    reg_date = current_date - timedelta(days=30)
-            
-            days_ago = max((current_date - reg_date).days, 0)
-            weight = math.exp(-decay_rate * days_ago)
-            category_scores[category] = category_scores.get(category, 0) + weight
-        except Exception as e:
-            logger.error(f"Error processing booking for user {user_id}: {e}")
-            continue
-    
-    return category_scores
+    return scores
 
 def get_trend_based_events(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT e.*
+        FROM trend_recommendations t
+        JOIN events e ON e.id = t.event_id
+        WHERE t.user_id = ? AND e.date > ?
+        ORDER BY t.rank
+    """, (user_id, datetime.now().strftime("%Y-%m-%d")))
+    precomputed = cursor.fetchall()
+    conn.close()
+    if precomputed:
+        return precomputed
+
     scores = calculate_trend_scores(user_id)
     if not scores:
         return []
@@ -1159,16 +1636,17 @@ def generate_event_description(title, category, date=None, venue=None):
     else:
         prompt += " in an unspecified location."
     try:
-        response = co.chat.completions.create(
+        return llm_cache.cached_completion(
+            co,
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that generates exciting event descriptions."},
                 {"role": "user", "content": prompt}
             ],
+            ttl=LLM_CACHE_TTL,
             max_tokens=150,
             temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        ).strip()
     except Exception as e:
         logger.error(f"Groq generation error: {e}")
         return ""
@@ -1176,11 +1654,11 @@ def generate_event_description(title, category, date=None, venue=None):
 def extract_user_id_interests_to_csv():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT id, interests FROM users")
+    cursor.execute("SELECT id, interests, interests_mask FROM users")
     users = cursor.fetchall()
     conn.close()
     
-    user_data = [{"id": row["id"], "interests": row["interests"]} for row in users]
+    user_data = [{"id": row["id"], "interests": row["interests"], "interests_mask": row["interests_mask"]} for row in users]
     df = pd.DataFrame(user_data)
     df.to_csv("user_id_interests.csv", index=False)
     logger.info("User IDs and interests extracted and saved to user_id_interests.csv")
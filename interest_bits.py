@@ -0,0 +1,26 @@
+import numpy as np
+
+# Fixed category vocabulary; bit i of an interest mask stands for CATEGORIES[i]
+CATEGORIES = ["Technology", "Music", "Sports", "Art", "Business", "Games", "Movies", "Food", "Products"]
+CATEGORY_BITS = {category.lower(): 1 << index for index, category in enumerate(CATEGORIES)}
+
+# Set-bit counts for every possible mask, so popcount is a single table lookup
+POPCOUNT_TABLE = np.array([bin(mask).count("1") for mask in range(1 << len(CATEGORIES))], dtype=np.uint8)
+
+# Encode a list or comma-joined string of categories; unknown names are ignored
+def encode_interests(interests):
+    if not interests:
+        return 0
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    mask = 0
+    for interest in interests:
+        mask |= CATEGORY_BITS.get(str(interest).strip().lower(), 0)
+    return mask
+
+def decode_mask(mask):
+    return [category for index, category in enumerate(CATEGORIES) if mask & (1 << index)]
+
+# Shared-category counts of one user against many items: one bitwise AND and one table lookup
+def match_counts(user_mask, item_masks):
+    return POPCOUNT_TABLE[np.asarray(item_masks, dtype=np.int64) & user_mask]
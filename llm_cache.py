@@ -0,0 +1,100 @@
+import sqlite3
+import json
+import hashlib
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB_FILE = "llm_cache.db"
+DEFAULT_TTL = 24 * 3600  # seconds a cached completion stays valid
+MAX_ENTRIES = 2000  # least recently used entries are evicted beyond this
+
+# One row per distinct request; namespace/version tie an entry to the data it was generated from
+LLM_CACHE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        namespace TEXT,
+        version INTEGER,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)",
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_namespace ON llm_cache(namespace)"
+]
+
+cache_stats = {"hits": 0, "misses": 0}
+_initialized = set()
+
+def get_connection(db_file=CACHE_DB_FILE):
+    conn = sqlite3.connect(db_file, timeout=10)
+    if db_file not in _initialized:
+        for statement in LLM_CACHE_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        _initialized.add(db_file)
+    return conn
+
+# Stable key over the model, sampling parameters and full message list
+def make_key(model, messages, **params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Cached response text, or None when missing, older than ttl or generated for another version
+def get(key, ttl=DEFAULT_TTL, version=None, db_file=CACHE_DB_FILE):
+    now = time.time()
+    conn = get_connection(db_file)
+    try:
+        row = conn.execute("SELECT response, created_at, version FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, created_at, cached_version = row
+        if now - created_at > ttl or (version is not None and cached_version != version):
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return response
+    finally:
+        conn.close()
+
+# Store a response, drop entries of older versions in the same namespace and trim to max_entries
+def put(key, response, namespace=None, version=None, max_entries=MAX_ENTRIES, db_file=CACHE_DB_FILE):
+    now = time.time()
+    conn = get_connection(db_file)
+    try:
+        conn.execute("REPLACE INTO llm_cache (key, namespace, version, response, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                     (key, namespace, version, response, now, now))
+        if namespace is not None and version is not None:
+            conn.execute("DELETE FROM llm_cache WHERE namespace = ? AND version != ?", (namespace, version))
+        conn.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (max_entries,))
+        conn.commit()
+    finally:
+        conn.close()
+
+# Chat completion text through the cache; only a miss reaches the API
+def cached_completion(client, model, messages, ttl=DEFAULT_TTL, namespace=None, version=None, **params):
+    key = make_key(model, messages, **params)
+    try:
+        cached = get(key, ttl, version)
+    except sqlite3.Error as e:
+        logger.error(f"LLM cache read failed: {e}")
+        cached = None
+    if cached is not None:
+        cache_stats["hits"] += 1
+        logger.info(f"LLM cache hit for {namespace or model}")
+        return cached
+    cache_stats["misses"] += 1
+    response = client.chat.completions.create(model=model, messages=messages, **params)
+    content = response.choices[0].message.content
+    try:
+        put(key, content, namespace, version)
+    except sqlite3.Error as e:
+        logger.error(f"LLM cache write failed: {e}")
+    return content
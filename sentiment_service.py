@@ -0,0 +1,50 @@
+import logging
+from functools import lru_cache
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 4096  # distinct normalized texts kept in the polarity cache
+POSITIVE_THRESHOLD = 0.3
+NEGATIVE_THRESHOLD = -0.3
+
+_textblob = None
+_load_lock = Lock()
+
+# Import TextBlob on first use so app startup does not pay for loading it
+def get_textblob():
+    global _textblob
+    if _textblob is None:
+        with _load_lock:
+            if _textblob is None:
+                from textblob import TextBlob
+                _textblob = TextBlob
+                logger.info("Loaded TextBlob sentiment analyzer")
+    return _textblob
+
+# Cache key for a text: trimmed, lowercased, whitespace collapsed
+def normalize_text(text):
+    return " ".join(str(text).split()).lower() if text else ""
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_polarity(normalized):
+    if not normalized:
+        return 0.0
+    return get_textblob()(normalized).sentiment.polarity
+
+# Polarity in [-1, 1] for one text
+def polarity(text):
+    return _cached_polarity(normalize_text(text))
+
+# Polarities for many texts, scoring each distinct normalized text once
+def polarities(texts):
+    normalized = [normalize_text(text) for text in texts]
+    scores = {text: _cached_polarity(text) for text in dict.fromkeys(normalized)}
+    return [scores[text] for text in normalized]
+
+def mood_from_polarity(score):
+    return "positive" if score > POSITIVE_THRESHOLD else "negative" if score < NEGATIVE_THRESHOLD else "neutral"
+
+# Mood bucket (positive, negative or neutral) for a free-text mood description
+def mood_bucket(text):
+    return mood_from_polarity(polarity(text))
@@ -0,0 +1,30 @@
+import math
+
+METERS_PER_DEGREE_LAT = 111320
+
+# Tables mirrored into R*Tree indexes, with the key column used as the R*Tree id
+SPATIAL_TABLES = [("stalls", "user_id"), ("user_locations", "user_id")]
+
+# Mirror stall and user positions into R*Tree indexes, kept in sync by triggers
+def create_spatial_index(cursor):
+    for table, key in SPATIAL_TABLES:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_rtree",))
+        exists = cursor.fetchone() is not None
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+        for event in ("INSERT", "UPDATE"):
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_rtree_{event.lower()} AFTER {event} ON {table} BEGIN
+                INSERT OR REPLACE INTO {table}_rtree VALUES (NEW.{key}, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+            END""")
+        cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_rtree_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM {table}_rtree WHERE id = OLD.{key};
+        END""")
+        # Backfill rows written before the index existed; afterwards the triggers keep it in sync
+        if not exists:
+            cursor.execute(f"""INSERT OR REPLACE INTO {table}_rtree
+                SELECT {key}, latitude, latitude, longitude, longitude FROM {table}""")
+
+# Latitude/longitude half-widths of a bounding box covering radius_m around a point
+def bounding_box(lat, lon, radius_m):
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return dlat, dlon
@@ -0,0 +1,79 @@
+import numpy as np
+from interest_bits import POPCOUNT_TABLE, match_counts
+
+EARTH_RADIUS_METERS = 6371008.8
+WALKING_SPEED_METERS_PER_MIN = 80
+DISTANCE_SCALE_METERS = 250  # distance score halves roughly every 175 m
+DEFAULT_TOP_N = 3
+
+# Relative importance of each component; weights are normalized to sum to 1
+DEFAULT_WEIGHTS = {"crowd": 0.5, "interest": 0.3, "distance": 0.2}
+
+# Merge caller weights over the defaults and normalize; raises ValueError on unknown, non-numeric or negative weights
+def normalize_weights(weights=None):
+    merged = dict(DEFAULT_WEIGHTS)
+    for name, value in (weights or {}).items():
+        if name not in DEFAULT_WEIGHTS:
+            raise ValueError(f"Unknown weight '{name}', expected one of {sorted(DEFAULT_WEIGHTS)}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or not np.isfinite(value):
+            raise ValueError(f"Weight '{name}' must be a non-negative number")
+        value = float(value)
+        merged[name] = value
+    total = sum(merged.values())
+    if total <= 0:
+        raise ValueError("At least one weight must be positive")
+    return {name: value / total for name, value in merged.items()}
+
+# Great-circle distance in meters from one point to arrays of points
+def haversine_meters(latitude, longitude, latitudes, longitudes):
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+# Score every stall in one vectorized pass and return the top_n with their component scores.
+# Stalls without a known position (NaN coordinates) get a distance score of 0.
+def score_stalls(stall_names, crowd_counts, stall_masks, latitudes, longitudes,
+                 user_mask=0, user_position=None, weights=None, top_n=DEFAULT_TOP_N):
+    weights = normalize_weights(weights)
+    crowd = np.asarray(crowd_counts, dtype=np.float64)
+    if crowd.size == 0:
+        return []
+
+    # Crowd: emptiest stall scores 1, busiest 0
+    busiest = crowd.max()
+    crowd_score = 1 - crowd / busiest if busiest > 0 else np.ones_like(crowd)
+
+    # Interest: share of the user's categories the stall covers
+    shared = match_counts(user_mask, stall_masks)
+    user_categories = int(POPCOUNT_TABLE[user_mask]) if user_mask else 0
+    interest_score = shared / user_categories if user_categories else np.zeros_like(crowd)
+
+    # Distance: exponential falloff from the user's latest position
+    if user_position is not None:
+        distance = haversine_meters(user_position[0], user_position[1],
+                                    np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64))
+        distance_score = np.nan_to_num(np.exp(-distance / DISTANCE_SCALE_METERS), nan=0.0)
+    else:
+        distance = np.full_like(crowd, np.nan)
+        distance_score = np.zeros_like(crowd)
+
+    contributions = {"crowd": weights["crowd"] * crowd_score,
+                     "interest": weights["interest"] * interest_score,
+                     "distance": weights["distance"] * distance_score}
+    total = contributions["crowd"] + contributions["interest"] + contributions["distance"]
+    order = np.argsort(-total, kind="stable")[:max(int(top_n), 1)]
+
+    return [{
+        "stall": stall_names[index],
+        "score": round(float(total[index]), 4),
+        "crowd_count": float(crowd[index]),
+        "crowd_score": round(float(crowd_score[index]), 4),
+        "interest_score": round(float(interest_score[index]), 4),
+        "shared_categories": int(shared[index]),
+        "distance_meters": None if np.isnan(distance[index]) else round(float(distance[index]), 1),
+        "walk_minutes": None if np.isnan(distance[index]) else round(float(distance[index]) / WALKING_SPEED_METERS_PER_MIN, 1),
+        "distance_score": round(float(distance_score[index]), 4),
+        # Component with the largest weighted share of the score; ties favour crowd, then interest
+        "dominant": max(contributions, key=lambda name: contributions[name][index])
+    } for index in order]
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app modules live at the repository root. It goes last on sys.path, also when `python -m pytest`
+# put the working directory first, so the root's csv.py does not shadow the standard library for pandas.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != ROOT] + [ROOT]
+if os.path.dirname(os.path.abspath(getattr(sys.modules.get("csv"), "__file__", None) or os.sep)) == ROOT:
+    del sys.modules["csv"]
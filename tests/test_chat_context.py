@@ -0,0 +1,48 @@
+import types
+import pytest
+import chat_context
+import llm_cache
+from token_estimate import estimate_tokens
+
+# Summaries go through the on-disk completion cache, so each test gets its own cache file
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(llm_cache, "_initialized", set())
+
+class FakeClient:
+    def __init__(self):
+        self.prompts = []
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **params):
+        self.prompts.append(messages[-1]["content"])
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=f"summary {len(self.prompts)}"))])
+
+def history(count, length=400):
+    return [{"role": "user" if index % 2 == 0 else "assistant", "message": f"turn {index} " + "x" * length} for index in range(count)]
+
+def test_short_conversations_are_sent_verbatim():
+    client, context = FakeClient(), chat_context.new_context()
+    messages = chat_context.build_messages(client, "system", history(4, 10), "hi", context)
+    assert len(messages) == 6
+    assert client.prompts == []
+
+def test_evicted_turns_are_folded_into_the_summary():
+    client, context, turns = FakeClient(), chat_context.new_context(), history(20)
+    messages = chat_context.build_messages(client, "system", turns, "hi", context, budget=600)
+    verbatim = messages[2:-1]
+    # Every turn is either covered by the summary or sent verbatim, and the prompt stays within budget
+    assert context["summarized"] + len(verbatim) == len(turns)
+    assert messages[1]["content"].startswith("Summary of the earlier conversation: summary")
+    assert "turn 0 " in client.prompts[0]
+    assert context["last_prompt_tokens"] == sum(estimate_tokens(message["content"]) for message in messages)
+    assert context["last_prompt_tokens"] <= 600
+
+def test_background_summary_is_adopted_when_done():
+    client, context, turns = FakeClient(), chat_context.new_context(), history(10, 10)
+    chat_context.schedule_summary(client, context, turns, recent_messages=4)
+    context["pending"].result()
+    chat_context.collect_summary(context)
+    assert context["summarized"] == 6
+    assert context["summary"] == "summary 1"
@@ -0,0 +1,37 @@
+import pytest
+import chat_router
+
+@pytest.mark.parametrize("text, intent", [
+    ("Please register me for Tech Fest", "register"),
+    ("can you sign me up for the music night?", "register"),
+    ("I want to book a seat", "register"),
+    ("How do I create an event?", "create_event"),
+    ("I'd like to host a new event", "create_event"),
+    ("How busy is the Food Stall?", "crowd_density"),
+    ("crowd density near me", "crowd_density"),
+    ("Can you recommend something?", "recommendations"),
+    ("What should I attend today", "recommendations"),
+    ("Show me the reviews for Art Expo", "feedback"),
+    ("What's the weather like?", None),
+])
+def test_classify(text, intent):
+    assert chat_router.classify(text) == intent
+
+def test_register_wins_over_later_intents():
+    assert chat_router.classify("register me and show the feedback") == "register"
+
+def test_find_entity_prefers_the_longest_name():
+    names = ["Tech Fest", "Tech Fest 2", "Art Expo"]
+    assert chat_router.find_entity("register me for tech fest 2 please", names) == "Tech Fest 2"
+    assert chat_router.find_entity("register me for Tech Fest", names) == "Tech Fest"
+    assert chat_router.find_entity("register me", names) is None
+
+def test_route_counts_local_answers_and_fallbacks(monkeypatch):
+    monkeypatch.setattr(chat_router, "router_stats", {"routed": chat_router.Counter(), "fallback": 0})
+    handlers = {"crowd_density": lambda text: "quiet", "feedback": lambda text: None}
+    assert chat_router.route("how busy is it", handlers) == "quiet"
+    assert chat_router.route("any reviews?", handlers) is None  # handler deferred to the LLM
+    assert chat_router.route("tell me a joke", handlers) is None
+    assert chat_router.router_stats["routed"]["crowd_density"] == 1
+    assert chat_router.router_stats["fallback"] == 2
+    assert chat_router.hit_rate() == pytest.approx(1 / 3)
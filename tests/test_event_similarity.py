@@ -0,0 +1,61 @@
+import sqlite3
+import pytest
+import event_similarity
+
+REGISTRATIONS = [(1, 10), (1, 11), (2, 10), (2, 12), (3, 11), (3, 10), (3, 12), (4, 12), (4, 13), (1, 13)]
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE registrations (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, event_id INTEGER)")
+    event_similarity.create_similarity_tables(cursor)
+    yield cursor
+    conn.close()
+
+def register(cursor, user_id, event_id):
+    cursor.execute("INSERT INTO registrations (user_id, event_id) VALUES (?, ?)", (user_id, event_id))
+    event_similarity.record_registration(cursor, user_id, event_id)
+
+def snapshot(cursor):
+    return {table: sorted(cursor.execute(f"SELECT * FROM {table}").fetchall())
+            for table in ("event_popularity", "event_cooccurrence", "event_similar")}
+
+def similar(cursor, event_id):
+    return cursor.execute("SELECT rank, similar_id, score FROM event_similar WHERE event_id = ? ORDER BY rank", (event_id,)).fetchall()
+
+def test_incremental_counts_match_rebuild(cursor):
+    for user_id, event_id in REGISTRATIONS:
+        register(cursor, user_id, event_id)
+    incremental = snapshot(cursor)
+    event_similarity.rebuild_similarity(cursor)
+    rebuilt = snapshot(cursor)
+    assert incremental["event_popularity"] == rebuilt["event_popularity"]
+    assert incremental["event_cooccurrence"] == rebuilt["event_cooccurrence"]
+
+def test_lists_touched_by_a_registration_match_rebuild(cursor):
+    for user_id, event_id in REGISTRATIONS[:-1]:
+        register(cursor, user_id, event_id)
+    user_id, event_id = REGISTRATIONS[-1]
+    register(cursor, user_id, event_id)
+    affected = [event_id] + [row[0] for row in cursor.execute(
+        "SELECT event_id FROM registrations WHERE user_id = ? AND event_id != ?", (user_id, event_id))]
+    incremental = {affected_id: similar(cursor, affected_id) for affected_id in affected}
+    event_similarity.rebuild_similarity(cursor)
+    assert incremental == {affected_id: similar(cursor, affected_id) for affected_id in affected}
+
+def test_cosine_scores_and_ranking(cursor):
+    for user_id, event_id in [(1, 10), (1, 11), (2, 10), (2, 11), (3, 10), (3, 12)]:
+        register(cursor, user_id, event_id)
+    # 10: 3 registrations, 11: 2 (both shared with 10), 12: 1 (shared with 10)
+    ranked = similar(cursor, 10)
+    assert [row[1] for row in ranked] == [11, 12]
+    assert ranked[0][2] == pytest.approx(2 / (3 * 2) ** 0.5)
+    assert ranked[1][2] == pytest.approx(1 / 3 ** 0.5)
+
+def test_remove_event_drops_it_from_every_list(cursor):
+    for user_id, event_id in REGISTRATIONS:
+        register(cursor, user_id, event_id)
+    event_similarity.remove_event(cursor, 12)
+    assert cursor.execute("SELECT COUNT(*) FROM event_similar WHERE event_id = 12 OR similar_id = 12").fetchone()[0] == 0
+    assert cursor.execute("SELECT COUNT(*) FROM event_cooccurrence WHERE event_a = 12 OR event_b = 12").fetchone()[0] == 0
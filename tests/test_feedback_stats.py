@@ -0,0 +1,58 @@
+import sqlite3
+import pytest
+import feedback_stats
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute(feedback_stats.FEEDBACK_AGGREGATES_SCHEMA)
+    yield cursor
+    conn.close()
+
+def test_add_then_remove_round_trips(cursor):
+    feedback_stats.add_feedback(cursor, "Tech Fest", 5, 0.8)
+    feedback_stats.add_feedback(cursor, "Tech Fest", 3, -0.2)
+    feedback_stats.record_response(cursor, "Tech Fest")
+    aggregate = feedback_stats.get_aggregate(cursor, "Tech Fest")
+    assert aggregate["count"] == 2
+    assert aggregate["mean_rating"] == pytest.approx(4.0)
+    assert aggregate["mean_sentiment"] == pytest.approx(0.3)
+    assert aggregate["histogram"] == {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}
+    assert aggregate["responses"] == 1
+
+    feedback_stats.remove_feedback(cursor, "Tech Fest", 5, 0.8, responded=True)
+    aggregate = feedback_stats.get_aggregate(cursor, "Tech Fest")
+    assert aggregate["count"] == 1
+    assert aggregate["mean_rating"] == pytest.approx(3.0)
+    assert aggregate["histogram"][5] == 0
+    assert aggregate["responses"] == 0
+
+    feedback_stats.remove_feedback(cursor, "Tech Fest", 3, -0.2)
+    assert feedback_stats.get_aggregate(cursor, "Tech Fest") is None
+    assert feedback_stats.get_feedback_events(cursor) == []
+
+def test_version_only_moves_forward(cursor):
+    assert feedback_stats.get_version(cursor, "Art Expo") == 0
+    feedback_stats.add_feedback(cursor, "Art Expo", 4, 0.1)
+    feedback_stats.remove_feedback(cursor, "Art Expo", 4, 0.1)
+    assert feedback_stats.get_version(cursor, "Art Expo") == 2
+
+def test_ratings_are_clamped_to_the_histogram(cursor):
+    assert feedback_stats.rating_column(0) == "rating_1"
+    assert feedback_stats.rating_column(4.6) == "rating_5"
+    assert feedback_stats.rating_column(9) == "rating_5"
+
+def test_rebuild_matches_incremental_totals(cursor):
+    rows = [("Tech Fest", 5, 0.5, True), ("Tech Fest", 2, -0.4, False), ("Art Expo", 4, 0.2, False)]
+    for event, rating, sentiment, responded in rows:
+        feedback_stats.add_feedback(cursor, event, rating, sentiment)
+        if responded:
+            feedback_stats.record_response(cursor, event)
+    incremental = {event: feedback_stats.get_aggregate(cursor, event) for event in ("Tech Fest", "Art Expo")}
+    assert feedback_stats.rebuild_aggregates(cursor, rows) == 3
+    for event, aggregate in incremental.items():
+        rebuilt = feedback_stats.get_aggregate(cursor, event)
+        assert {key: value for key, value in rebuilt.items() if key != "version"} == \
+               {key: value for key, value in aggregate.items() if key != "version"}
+        assert rebuilt["version"] > aggregate["version"]
@@ -0,0 +1,16 @@
+import feedback_summary
+from token_estimate import CHARS_PER_TOKEN
+
+def test_chunks_respect_the_token_limit_and_keep_order():
+    texts = [f"comment {index} " + "y" * 40 for index in range(30)]
+    chunks = feedback_summary.chunk_texts(texts, max_tokens=50)
+    assert [text for chunk in chunks for text in chunk] == texts
+    assert all(sum(feedback_summary.estimate_tokens(text) for text in chunk) <= 50 for chunk in chunks)
+
+def test_blank_texts_are_skipped_and_long_ones_truncated():
+    chunks = feedback_summary.chunk_texts(["  ", "", "z" * 1000], max_tokens=10)
+    assert chunks == [["z" * (10 * CHARS_PER_TOKEN)]]
+
+def test_small_feedback_sets_need_no_llm_call():
+    assert feedback_summary.summarize_feedback(None, "Tech Fest", ["Great talks", " Loved it "]) == "Great talks\nLoved it"
+    assert feedback_summary.summarize_feedback(None, "Tech Fest", []) == ""
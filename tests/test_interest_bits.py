@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("numpy")
+import interest_bits
+
+def test_encode_and_decode_round_trip():
+    mask = interest_bits.encode_interests("Technology, music ,Unknown")
+    assert interest_bits.decode_mask(mask) == ["Technology", "Music"]
+    assert interest_bits.encode_interests(["Food", "food"]) == interest_bits.CATEGORY_BITS["food"]
+    assert interest_bits.encode_interests("") == 0
+
+def test_match_counts_counts_shared_categories():
+    user = interest_bits.encode_interests("Technology,Music,Games")
+    items = [interest_bits.encode_interests(categories) for categories in ("Music", "Technology,Games", "Art", "")]
+    assert interest_bits.match_counts(user, items).tolist() == [1, 2, 0, 0]
@@ -0,0 +1,63 @@
+import types
+import pytest
+import llm_cache
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **params):
+        self.calls += 1
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=f"reply {self.calls}"))])
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "llm_cache.db")
+
+def test_key_is_stable_and_depends_on_params():
+    messages = [{"role": "user", "content": "hi"}]
+    assert llm_cache.make_key("m", messages, temperature=0) == llm_cache.make_key("m", messages, temperature=0)
+    assert llm_cache.make_key("m", messages, temperature=0) != llm_cache.make_key("m", messages, temperature=1)
+
+def test_entries_expire_after_ttl(db_file, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    llm_cache.put("k", "value", db_file=db_file)
+    now[0] += 10
+    assert llm_cache.get("k", ttl=60, db_file=db_file) == "value"
+    now[0] += 100
+    assert llm_cache.get("k", ttl=60, db_file=db_file) is None
+
+def test_least_recently_used_entries_are_evicted(db_file, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    for key in ("a", "b"):
+        llm_cache.put(key, key, max_entries=2, db_file=db_file)
+        now[0] += 1
+    assert llm_cache.get("a", db_file=db_file) == "a"  # "b" is now the least recently used
+    now[0] += 1
+    llm_cache.put("c", "c", max_entries=2, db_file=db_file)
+    assert llm_cache.get("b", db_file=db_file) is None
+    assert llm_cache.get("a", db_file=db_file) == "a"
+    assert llm_cache.get("c", db_file=db_file) == "c"
+
+def test_new_version_invalidates_the_namespace(db_file):
+    llm_cache.put("old", "v1 analysis", namespace="event:Tech Fest", version=1, db_file=db_file)
+    llm_cache.put("other", "other analysis", namespace="event:Art Expo", version=1, db_file=db_file)
+    assert llm_cache.get("old", version=2, db_file=db_file) is None
+    llm_cache.put("old", "v1 analysis", namespace="event:Tech Fest", version=1, db_file=db_file)
+    llm_cache.put("new", "v2 analysis", namespace="event:Tech Fest", version=2, db_file=db_file)
+    assert llm_cache.get("old", db_file=db_file) is None
+    assert llm_cache.get("new", version=2, db_file=db_file) == "v2 analysis"
+    assert llm_cache.get("other", version=1, db_file=db_file) == "other analysis"
+
+def test_cached_completion_calls_the_api_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(llm_cache, "_initialized", set())
+    client = FakeClient()
+    messages = [{"role": "user", "content": "hello"}]
+    first = llm_cache.cached_completion(client, "m", messages, temperature=0)
+    second = llm_cache.cached_completion(client, "m", messages, temperature=0)
+    assert first == second == "reply 1"
+    assert client.calls == 1
@@ -0,0 +1,22 @@
+import sqlite3
+import pytest
+import spatial_index
+
+def test_rtree_is_backfilled_once_and_kept_in_sync_by_triggers():
+    cursor = sqlite3.connect(":memory:").cursor()
+    cursor.execute("CREATE TABLE stalls (user_id INTEGER PRIMARY KEY, stall_name TEXT, latitude REAL, longitude REAL)")
+    cursor.execute("CREATE TABLE user_locations (user_id INTEGER PRIMARY KEY, latitude REAL, longitude REAL, timestamp TEXT)")
+    cursor.execute("INSERT INTO stalls VALUES (1, 'Food Stall', 12.0, 80.0)")
+    spatial_index.create_spatial_index(cursor)
+    spatial_index.create_spatial_index(cursor)
+    cursor.execute("INSERT INTO user_locations VALUES (7, 12.5, 80.5, '')")
+    cursor.execute("UPDATE user_locations SET latitude = 13.0 WHERE user_id = 7")
+    cursor.execute("DELETE FROM stalls WHERE user_id = 1")
+    assert cursor.execute("SELECT * FROM stalls_rtree").fetchall() == []
+    assert cursor.execute("SELECT id, min_lat, min_lon FROM user_locations_rtree").fetchall() == [(7, 13.0, 80.5)]
+
+def test_bounding_box_widens_with_latitude():
+    dlat, dlon = spatial_index.bounding_box(0.0, 0.0, 111320)
+    assert dlat == pytest.approx(1.0)
+    assert dlon == pytest.approx(1.0)
+    assert spatial_index.bounding_box(60.0, 0.0, 111320)[1] == pytest.approx(2.0)
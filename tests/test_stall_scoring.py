@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+import stall_scoring
+from interest_bits import encode_interests
+
+def test_normalize_weights_merges_and_sums_to_one():
+    weights = stall_scoring.normalize_weights({"crowd": 2, "interest": 1, "distance": 1})
+    assert weights == pytest.approx({"crowd": 0.5, "interest": 0.25, "distance": 0.25})
+    assert sum(stall_scoring.normalize_weights().values()) == pytest.approx(1.0)
+    assert stall_scoring.normalize_weights({"crowd": 1, "interest": 0, "distance": 0})["crowd"] == 1.0
+
+@pytest.mark.parametrize("weights", [
+    {"crowd": None},
+    {"crowd": [1]},
+    {"crowd": "0.5"},
+    {"crowd": True},
+    {"crowd": -1},
+    {"crowd": float("inf")},
+    {"crowd": float("nan")},
+    {"speed": 1},
+    {"crowd": 0, "interest": 0, "distance": 0},
+])
+def test_normalize_weights_rejects_bad_input(weights):
+    with pytest.raises(ValueError):
+        stall_scoring.normalize_weights(weights)
+
+def test_score_stalls_ranks_and_reports_the_dominant_component():
+    ranking = stall_scoring.score_stalls(
+        ["Food Stall", "Tech Stall", "Game Stall"],
+        [8, 2, 4],
+        [encode_interests("Food"), encode_interests("Technology"), encode_interests("Games")],
+        [12.0, 12.0, float("nan")],
+        [80.0, 80.01, float("nan")],
+        user_mask=encode_interests("Technology,Games"),
+        user_position=(12.0, 80.0),
+        top_n=3
+    )
+    assert [entry["stall"] for entry in ranking] == ["Tech Stall", "Game Stall", "Food Stall"]
+    tech, game, food = ranking
+    assert tech["dominant"] == "crowd"
+    assert tech["shared_categories"] == 1
+    assert game["distance_meters"] is None and game["distance_score"] == 0
+    assert food["crowd_score"] == 0 and food["dominant"] == "distance"
+
+def test_interest_weight_can_decide_the_pick():
+    ranking = stall_scoring.score_stalls(["Quiet", "Matching"], [1, 5], [0, encode_interests("Music")],
+                                         [np.nan, np.nan], [np.nan, np.nan], user_mask=encode_interests("Music"),
+                                         weights={"crowd": 0.2, "interest": 1, "distance": 0}, top_n=1)
+    assert ranking[0]["stall"] == "Matching"
+    assert ranking[0]["dominant"] == "interest"
+
+def test_no_stalls_scores_nothing():
+    assert stall_scoring.score_stalls([], [], [], [], []) == []
@@ -0,0 +1,40 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("pandas")
+import trend_scores
+
+NOW = datetime(2025, 3, 1, 12, 0, 0)
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute(trend_scores.USER_CATEGORY_SCORES_SCHEMA)
+    yield cursor
+    conn.close()
+
+def test_apply_then_remove_round_trips(cursor):
+    first, second = NOW - timedelta(days=10), NOW
+    trend_scores.apply_registration(cursor, 1, "Music", first)
+    trend_scores.apply_registration(cursor, 1, "Music", second)
+    scores = trend_scores.get_category_scores(cursor, 1, NOW)
+    assert scores["Music"] == pytest.approx(1 + trend_scores.decay_factor(NOW, first))
+    trend_scores.remove_registration(cursor, 1, "Music", first)
+    assert trend_scores.get_category_scores(cursor, 1, NOW)["Music"] == pytest.approx(1.0)
+    trend_scores.remove_registration(cursor, 1, "Music", second)
+    assert trend_scores.get_category_scores(cursor, 1, NOW) == {}
+
+def test_out_of_order_registrations_match_in_order(cursor):
+    dates = [NOW - timedelta(days=days) for days in (1, 20, 5)]
+    for registered_at in dates:
+        trend_scores.apply_registration(cursor, 1, "Art", registered_at)
+    expected = sum(trend_scores.decay_factor(NOW, registered_at) for registered_at in dates)
+    assert trend_scores.get_category_scores(cursor, 1, NOW)["Art"] == pytest.approx(expected)
+
+def test_undated_registrations_use_one_fallback():
+    assert trend_scores.registration_time("not a date", NOW) == NOW - trend_scores.UNDATED_REGISTRATION_AGE
+    assert trend_scores.registration_time(None, NOW) == NOW - trend_scores.UNDATED_REGISTRATION_AGE
+    assert trend_scores.registration_time("2099-01-01 00:00:00", NOW) == NOW
+    assert trend_scores.registration_time("2025-02-01 08:30:00", NOW) == datetime(2025, 2, 1, 8, 30, 0)
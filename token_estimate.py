@@ -0,0 +1,5 @@
+CHARS_PER_TOKEN = 4  # rough English average, used instead of a tokenizer
+
+# Approximate prompt tokens of a text, shared by the chat context budget and the feedback chunker
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
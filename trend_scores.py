@@ -0,0 +1,169 @@
+import sqlite3
+import math
+import sys
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = 'emr.db'
+DECAY_RATE = 0.02  # per day
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # same as SQLite CURRENT_TIMESTAMP (UTC)
+UNDATED_REGISTRATION_AGE = timedelta(days=30)  # registrations without a usable date count as a month old
+
+# Decayed category score per user, valid as of ref_ts; score(t) = score * exp(-DECAY_RATE * days(t - ref_ts))
+USER_CATEGORY_SCORES_SCHEMA = '''CREATE TABLE IF NOT EXISTS user_category_scores (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    score REAL NOT NULL,
+    ref_ts TEXT NOT NULL,
+    PRIMARY KEY (user_id, category)
+)'''
+
+# Top upcoming events per user from the user's highest-scoring category, written by the batch job
+TREND_RECOMMENDATIONS_SCHEMA = '''CREATE TABLE IF NOT EXISTS trend_recommendations (
+    user_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    event_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    score REAL NOT NULL,
+    computed_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, rank)
+)'''
+
+def parse_timestamp(value, default=None):
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    except (ValueError, TypeError):
+        return default
+
+# Time a registration is weighted at: its parsed date capped at now, or UNDATED_REGISTRATION_AGE before now.
+# Every path that adds or subtracts registration weights goes through this so they agree.
+def registration_time(value, now):
+    return min(parse_timestamp(value, now - UNDATED_REGISTRATION_AGE), now)
+
+def decay_factor(later, earlier, decay_rate=DECAY_RATE):
+    days = (later - earlier).total_seconds() / 86400
+    return math.exp(-decay_rate * days)
+
+# O(1) update for a new registration: rescale the stored score to the registration time and add its weight
+def apply_registration(cursor, user_id, category, registered_at):
+    cursor.execute("SELECT score, ref_ts FROM user_category_scores WHERE user_id = ? AND category = ?", (user_id, category))
+    row = cursor.fetchone()
+    if row is None:
+        score, ref_ts = 1.0, registered_at
+    else:
+        stored_ref = parse_timestamp(row[1], registered_at)
+        if registered_at >= stored_ref:
+            score, ref_ts = row[0] * decay_factor(registered_at, stored_ref) + 1.0, registered_at
+        else:
+            # Older registration (e.g. a backfill): add its weight as seen from the stored reference time
+            score, ref_ts = row[0] + decay_factor(stored_ref, registered_at), stored_ref
+    cursor.execute("REPLACE INTO user_category_scores (user_id, category, score, ref_ts) VALUES (?, ?, ?, ?)",
+                   (user_id, category, score, ref_ts.strftime(TIMESTAMP_FORMAT)))
+
+# O(1) update for a removed registration: subtract its weight as seen from the stored reference time
+def remove_registration(cursor, user_id, category, registered_at):
+    cursor.execute("SELECT score, ref_ts FROM user_category_scores WHERE user_id = ? AND category = ?", (user_id, category))
+    row = cursor.fetchone()
+    if row is None:
+        return
+    stored_ref = parse_timestamp(row[1], registered_at)
+    score = row[0] - decay_factor(stored_ref, registered_at) if registered_at <= stored_ref else row[0]
+    if score <= 1e-9:
+        cursor.execute("DELETE FROM user_category_scores WHERE user_id = ? AND category = ?", (user_id, category))
+    else:
+        cursor.execute("UPDATE user_category_scores SET score = ? WHERE user_id = ? AND category = ?", (score, user_id, category))
+
+# Current decayed scores for one user, read with a single primary-key range lookup
+def get_category_scores(cursor, user_id, now=None):
+    now = now or datetime.utcnow()
+    cursor.execute("SELECT category, score, ref_ts FROM user_category_scores WHERE user_id = ?", (user_id,))
+    return {row[0]: row[1] * decay_factor(now, parse_timestamp(row[2], now)) for row in cursor.fetchall()}
+
+# Recompute every user's scores from registrations joined with events
+def rebuild_scores(cursor):
+    now = datetime.utcnow()
+    cursor.execute("""
+        SELECT r.user_id, e.category, r.registration_date
+        FROM registrations r
+        JOIN events e ON r.event_id = e.id
+        WHERE r.user_id IS NOT NULL
+    """)
+    scores = {}
+    for user_id, category, registration_date in cursor.fetchall():
+        if not category:
+            continue
+        registered_at = registration_time(registration_date, now)
+        key = (user_id, category)
+        scores[key] = scores.get(key, 0.0) + decay_factor(now, registered_at)
+    cursor.execute("DELETE FROM user_category_scores")
+    ref_ts = now.strftime(TIMESTAMP_FORMAT)
+    cursor.executemany("INSERT INTO user_category_scores (user_id, category, score, ref_ts) VALUES (?, ?, ?, ?)",
+                       [(user_id, category, score, ref_ts) for (user_id, category), score in scores.items()])
+    logger.info(f"Rebuilt category scores for {len(scores)} user/category pairs")
+    return len(scores)
+
+def rebuild_user_category_scores(db_file=DB_FILE):
+    with sqlite3.connect(db_file) as conn:
+        cursor = conn.cursor()
+        # Hold the write lock from the read to the rewrite so concurrent registrations are not lost
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(USER_CATEGORY_SCORES_SCHEMA)
+        count = rebuild_scores(cursor)
+        conn.commit()
+    return count
+
+# Batch job: vectorized decayed scores for all users and their top upcoming events in the best category
+def precompute_trend_recommendations(db_file=DB_FILE, top_n=3, decay_rate=DECAY_RATE):
+    now = datetime.utcnow().replace(microsecond=0)
+    with sqlite3.connect(db_file) as conn:
+        # The scores are replaced from this read, so registrations must wait until the rewrite commits
+        # instead of updating rows that are about to be overwritten
+        conn.execute("BEGIN IMMEDIATE")
+        bookings = pd.read_sql_query("""
+            SELECT r.user_id, e.category, r.registration_date
+            FROM registrations r
+            JOIN events e ON r.event_id = e.id
+            WHERE r.user_id IS NOT NULL AND e.category IS NOT NULL AND e.category != ''
+        """, conn)
+        upcoming = pd.read_sql_query("SELECT id AS event_id, category, date FROM events WHERE date > ? ORDER BY date ASC",
+                                     conn, params=(now.strftime("%Y-%m-%d"),))
+
+        registered_at = pd.to_datetime(bookings["registration_date"], format=TIMESTAMP_FORMAT, errors="coerce")
+        registered_at = registered_at.fillna(pd.Timestamp(now - UNDATED_REGISTRATION_AGE)).clip(upper=pd.Timestamp(now))
+        days = (pd.Timestamp(now) - registered_at).dt.total_seconds().to_numpy() / 86400
+        bookings["weight"] = np.exp(-decay_rate * days)
+        scores = bookings.groupby(["user_id", "category"], as_index=False)["weight"].sum()
+
+        # Highest-scoring category per user, then that category's soonest upcoming events
+        top_categories = scores.sort_values(["user_id", "weight"], ascending=[True, False]).drop_duplicates("user_id")
+        top_events = upcoming.groupby("category").head(top_n)
+        recommendations = top_categories.merge(top_events, on="category")
+        recommendations["rank"] = recommendations.groupby("user_id").cumcount() + 1
+
+        computed_at = now.strftime(TIMESTAMP_FORMAT)
+        cursor = conn.cursor()
+        cursor.execute(USER_CATEGORY_SCORES_SCHEMA)
+        cursor.execute(TREND_RECOMMENDATIONS_SCHEMA)
+        cursor.execute("DELETE FROM user_category_scores")
+        cursor.executemany("INSERT INTO user_category_scores (user_id, category, score, ref_ts) VALUES (?, ?, ?, ?)",
+                           [(int(row.user_id), row.category, float(row.weight), computed_at) for row in scores.itertuples()])
+        cursor.execute("DELETE FROM trend_recommendations")
+        cursor.executemany("INSERT INTO trend_recommendations (user_id, rank, event_id, category, score, computed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                           [(int(row.user_id), int(row.rank), int(row.event_id), row.category, float(row.weight), computed_at)
+                            for row in recommendations.itertuples()])
+        conn.commit()
+    logger.info(f"Precomputed {len(recommendations)} trend recommendations for {recommendations['user_id'].nunique()} users")
+    return len(recommendations)
+
+if __name__ == "__main__":
+    commands = {"rebuild": rebuild_user_category_scores, "precompute": precompute_trend_recommendations}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python trend_scores.py {rebuild|precompute} [db_file]")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    count = commands[sys.argv[1]](sys.argv[2] if len(sys.argv) > 2 else DB_FILE)
+    print(f"[{datetime.utcnow().isoformat()}] {sys.argv[1]} finished: {count} rows written")